@@ -0,0 +1,184 @@
+from __future__ import annotations
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
+import hashlib
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+from typing import Dict, Iterable, List
+
+from .config import CACHE_DIR
+
+# Bump when the layout of the artifacts (not just their content) changes.
+FORMAT_VERSION = 1
+MANIFEST_NAME = "kb.manifest.json"
+MANIFEST_PATH = CACHE_DIR / MANIFEST_NAME
+
+
+class ArtifactError(RuntimeError):
+    """Index artifacts are missing, corrupt, or were built for a different embedder/backend."""
+
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def source_digests(files: Iterable[Path], root: Path) -> Dict[str, str]:
+    """{KB file name relative to `root`: sha256}; stored in the manifest so an incremental
+    update can tell which files really changed without rehashing the others."""
+    return {p.relative_to(root).as_posix(): sha256_file(p) for p in files}
+
+def digests_hash(digests: Dict[str, str]) -> str:
+    """Order-independent hash of the KB files' names and contents."""
+    h = hashlib.sha256()
+    for name in sorted(digests):
+        h.update(name.encode("utf-8") + b"\0")
+        h.update(digests[name].encode("ascii"))
+    return h.hexdigest()
+
+def kb_content_hash(files: Iterable[Path], root: Path) -> str:
+    """Hash of the KB files' names and bytes (order-independent)."""
+    return digests_hash(source_digests(files, root))
+
+def _build_id(embedder: Dict, params: Dict, projection: Dict | None) -> str:
+    """Hash of everything besides the KB content that changes the index: embedder, build
+    parameters (chunking, dedup, projection settings) and the fitted projection."""
+    payload = {"embedder": embedder, "params": params, "projection": projection}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+def make_manifest(
+    files: Dict[str, Path],
+    embedder: Dict,
+    index_format: str,
+    kb_hash: str,
+    stats: Dict,
+    params: Dict | None = None,
+    sources: Dict[str, str] | None = None,
+) -> Dict:
+    """Checksum `files` ({name relative to the cache dir: path to read now}) into a manifest.
+
+    Paths may point at staged files that `publish()` renames to their final names.
+    `sources` ({KB file: sha256}) records the digests the index was built from. The version
+    changes with the KB content, the embedder and the build parameters.
+    """
+    manifest = {
+        "format": FORMAT_VERSION,
+        "version": f"{kb_hash[:12]}-{_build_id(embedder, params or {}, stats.get('projection'))[:8]}",
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "embedder": embedder,
+        "index_format": index_format,
+        "params": params or {},
+        "kb_hash": kb_hash,
+        "chunks": stats.get("chunks"),
+        "dim": stats.get("dim"),
+        "files": {name: {"sha256": sha256_file(p), "bytes": p.stat().st_size} for name, p in sorted(files.items())},
+    }
+    if stats.get("projection"):
+        manifest["projection"] = stats["projection"]
+    if sources is not None:
+        manifest["sources"] = dict(sorted(sources.items()))
+    return manifest
+
+def publish(files: Dict[str, Path], manifest: Dict, last: str, cache_dir: Path = CACHE_DIR) -> None:
+    """Rename staged `files` ({name relative to `cache_dir`: staged path}) into place.
+
+    Every artifact is complete and checksummed before the first rename, so the live set is
+    only mixed for the few renames in between. The manifest goes in just before `last` (the
+    metadata file that marks a new KB generation), which is renamed after all others.
+    """
+    for name in sorted(files, key=lambda n: n == last):
+        (cache_dir / name).parent.mkdir(parents=True, exist_ok=True)
+        if name == last:
+            tmp = cache_dir / (MANIFEST_NAME + ".tmp")
+            tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+            os.replace(tmp, cache_dir / MANIFEST_NAME)
+        os.replace(files[name], cache_dir / name)
+
+def read_manifest(cache_dir: Path = CACHE_DIR) -> Dict | None:
+    try:
+        return json.loads((cache_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+def check_compatible(manifest: Dict, embedder: Dict, index_format: str) -> None:
+    """Refuse artifacts this server cannot query correctly."""
+    if manifest.get("format") != FORMAT_VERSION:
+        raise ArtifactError(f"Index artifact format {manifest.get('format')} is not supported (expected {FORMAT_VERSION})")
+    if manifest.get("embedder") != embedder:
+        raise ArtifactError(f"Index was built with embedder {manifest.get('embedder')}, this server uses {embedder}")
+    if manifest.get("index_format") != index_format:
+        raise ArtifactError(f"Index format is {manifest.get('index_format')!r}, this server reads {index_format!r}")
+
+def verify(manifest: Dict, embedder: Dict, index_format: str, names: Iterable[str] | None = None, cache_dir: Path = CACHE_DIR) -> None:
+    """Check compatibility and the checksums of `names` (default: every file in the manifest)."""
+    check_compatible(manifest, embedder, index_format)
+    files = manifest.get("files", {})
+    for name in (files if names is None else names):
+        if name not in files:
+            raise ArtifactError(f"{name} is not part of index version {manifest.get('version')}")
+        path = cache_dir / name
+        if not path.exists():
+            raise ArtifactError(f"Missing index artifact {path}")
+        if path.stat().st_size != files[name]["bytes"] or sha256_file(path) != files[name]["sha256"]:
+            raise ArtifactError(f"Checksum mismatch for {path}")
+
+def pack_bundle(out: Path, cache_dir: Path = CACHE_DIR) -> Path:
+    """Write the manifest and every file it lists into one `.tar.gz` bundle."""
+    manifest = read_manifest(cache_dir)
+    if manifest is None:
+        raise ArtifactError(f"No {MANIFEST_NAME} in {cache_dir}; build the index first")
+    out.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out.with_name(out.name + ".tmp")
+    with tarfile.open(tmp, "w:gz") as tar:
+        tar.add(cache_dir / MANIFEST_NAME, arcname=MANIFEST_NAME)
+        for name in manifest["files"]:
+            tar.add(cache_dir / name, arcname=name)
+    os.replace(tmp, out)
+    return out
+
+def _safe_name(name: str) -> str:
+    p = PurePosixPath(name)
+    if p.is_absolute() or ".." in p.parts:
+        raise ArtifactError(f"Unsafe path in bundle: {name}")
+    return name
+
+def bundle_manifest(bundle: Path) -> Dict:
+    """The manifest inside `bundle`, without extracting anything else."""
+    with tarfile.open(bundle, "r:gz") as tar:
+        try:
+            return json.load(tar.extractfile(MANIFEST_NAME))  # type: ignore[arg-type]
+        except KeyError:
+            raise ArtifactError(f"{bundle} has no {MANIFEST_NAME}") from None
+
+def install_bundle(bundle: Path, embedder: Dict, index_format: str, last: str, cache_dir: Path = CACHE_DIR) -> Dict:
+    """Verify `bundle` and move its files into `cache_dir`.
+
+    Files are extracted and checksummed in a scratch directory first, so a bad bundle never
+    touches the live artifacts. `last` (the metadata file that marks a new KB generation) is
+    renamed into place after all others.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=cache_dir, prefix=".bundle-") as scratch, tarfile.open(bundle, "r:gz") as tar:
+        work = Path(scratch)
+        manifest = bundle_manifest(bundle)
+        check_compatible(manifest, embedder, index_format)
+        names: List[str] = [_safe_name(n) for n in manifest["files"]]
+        for name in names:
+            try:
+                src = tar.extractfile(name)
+            except KeyError:
+                src = None
+            if src is None:
+                raise ArtifactError(f"{bundle} is missing {name}")
+            dst = work / name
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            with src, dst.open("wb") as out:
+                shutil.copyfileobj(src, out)
+        verify(manifest, embedder, index_format, cache_dir=work)
+        publish({name: work / name for name in names}, manifest, last, cache_dir)
+    return manifest
@@ -0,0 +1,120 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+import gzip
+import hashlib
+import re
+from typing import Dict, Mapping, Optional, Tuple
+
+from fastapi.responses import Response
+try:
+    import brotli  # type: ignore
+except Exception:  # pragma: no cover
+    brotli = None  # type: ignore
+
+# /static/<name>.js|css references in the HTML shell (any old ?v= query string is dropped)
+_REF_RE = re.compile(r"""(?<=["'])/static/([\w.-]+\.(?:js|css))(?:\?[^"']*)?(?=["'])""")
+_MEDIA_TYPES = {".js": "text/javascript; charset=utf-8", ".css": "text/css; charset=utf-8", ".html": "text/html; charset=utf-8"}
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+
+@dataclass(frozen=True)
+class Asset:
+    """One file held in memory with its precompressed variants (None where compression does
+    not make it smaller) and a content-hash ETag per encoding."""
+    body: bytes
+    media_type: str
+    digest: str
+    gzip: Optional[bytes]
+    br: Optional[bytes]
+
+    @classmethod
+    def from_bytes(cls, body: bytes, media_type: str) -> "Asset":
+        gz = gzip.compress(body, compresslevel=9, mtime=0)
+        br = brotli.compress(body, quality=11) if brotli is not None else None
+        return cls(
+            body, media_type, hashlib.sha256(body).hexdigest()[:16],
+            gz if len(gz) < len(body) else None,
+            br if br is not None and len(br) < len(body) else None,
+        )
+
+    def select(self, accept_encoding: str) -> Tuple[bytes, Optional[str], str]:
+        """(payload, content-encoding or None, etag) for the client's Accept-Encoding."""
+        accepted = _accepted(accept_encoding)
+        if self.br is not None and "br" in accepted:
+            return self.br, "br", f'"{self.digest}-br"'
+        if self.gzip is not None and "gzip" in accepted:
+            return self.gzip, "gzip", f'"{self.digest}-gz"'
+        return self.body, None, f'"{self.digest}"'
+
+
+def _qvalue(params: str) -> float:
+    """q of one Accept-Encoding entry; 1 when absent or malformed (`q=.`, `q=abc`)."""
+    m = re.search(r"q\s*=\s*([^\s;]*)", params)
+    try:
+        return float(m.group(1)) if m else 1.0
+    except ValueError:
+        return 1.0
+
+def _accepted(header: str) -> frozenset:
+    """Codings with q > 0. `*` stands for gzip and br unless they are listed themselves."""
+    q: Dict[str, float] = {}
+    for part in (header or "").lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip():
+            q[coding.strip()] = _qvalue(params)
+    if "*" in q:
+        for coding in ("gzip", "br"):
+            q.setdefault(coding, q["*"])
+    return frozenset(c for c, v in q.items() if v > 0.0)
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+class AssetTable:
+    """Fingerprinted static files and the HTML shell, built once at startup.
+
+    Every `*.js` / `*.css` in `static_dir` is served as `<prefix><stem>.<hash>.<ext>`: its URL
+    changes with its content, so responses are cached as immutable for a year. The template's
+    `/static/...` references are rewritten to those URLs and the resulting shell is kept in
+    memory, revalidated by ETag. gzip (and brotli, if installed) variants are compressed once.
+    """
+
+    def __init__(self, static_dir: Path, template: Path, prefix: str = "/assets/"):
+        self.prefix = prefix
+        files: Dict[str, Asset] = {}
+        urls: Dict[str, str] = {}
+        for path in sorted(static_dir.iterdir()):
+            if path.suffix not in (".js", ".css") or not path.is_file():
+                continue
+            asset = Asset.from_bytes(path.read_bytes(), _MEDIA_TYPES[path.suffix])
+            name = f"{path.stem}.{asset.digest[:10]}{path.suffix}"
+            files[name] = asset
+            urls[path.name] = prefix + name
+        self.files: Mapping[str, Asset] = files
+        self.urls: Mapping[str, str] = urls
+        html = _REF_RE.sub(lambda m: urls.get(m.group(1), m.group(0)), template.read_text(encoding="utf-8"))
+        self.shell = Asset.from_bytes(html.encode("utf-8"), _MEDIA_TYPES[".html"])
+
+    def get(self, name: str) -> Optional[Asset]:
+        return self.files.get(name)
+
+    def stats(self) -> Dict:
+        def sizes(a: Asset) -> Dict:
+            return {"bytes": len(a.body), "gzip": len(a.gzip) if a.gzip else None, "br": len(a.br) if a.br else None}
+        return {"assets": {n: sizes(a) for n, a in self.files.items()}, "shell": sizes(self.shell), "brotli": brotli is not None}
+
+
+def asset_response(asset: Asset, headers: Mapping[str, str], cache_control: str) -> Response:
+    """200 with the best encoding the client accepts, or 304 if its cached copy is current."""
+    payload, encoding, etag = asset.select(headers.get("accept-encoding", ""))
+    out = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if _etag_matches(headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=out)
+    if encoding:
+        out["Content-Encoding"] = encoding
+    return Response(content=payload, media_type=asset.media_type, headers=out)
@@ -0,0 +1,97 @@
+from __future__ import annotations
+from collections import OrderedDict
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+
+class SemanticCache:
+    """Size-bounded LRU cache of final responses keyed by question embedding.
+
+    `lookup` returns the cached response of the most similar stored question when the
+    cosine similarity (inner product of normalized vectors) reaches `threshold`. Entries
+    belong to one KB generation; a lookup or store under a new generation drops them all.
+    Vectors live in one preallocated matrix, so a lookup is a single matrix-vector product.
+    """
+
+    def __init__(self, capacity: int = 512, threshold: float = 0.92):
+        self.capacity = max(0, capacity)
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vecs: Optional[np.ndarray] = None
+        self._valid = np.zeros(self.capacity, dtype=bool)
+        self._payloads: Dict[int, bytes] = {}
+        self._lru: "OrderedDict[int, None]" = OrderedDict()
+        self._generation = None
+        self._counts = {"hits": 0, "misses": 0, "stores": 0, "evictions": 0, "invalidations": 0}
+
+    def _check_generation(self, generation) -> None:
+        if generation != self._generation:
+            if self._lru:
+                self._counts["invalidations"] += 1
+            self._valid[:] = False
+            self._payloads.clear()
+            self._lru.clear()
+            self._generation = generation
+
+    def lookup(self, q_emb: np.ndarray, generation) -> Optional[bytes]:
+        if not self.capacity:
+            return None
+        with self._lock:
+            self._check_generation(generation)
+            if self._vecs is None or not self._lru:
+                self._counts["misses"] += 1
+                return None
+            sims = np.where(self._valid, self._vecs @ q_emb, -np.inf)
+            slot = int(np.argmax(sims))
+            if sims[slot] < self.threshold:
+                self._counts["misses"] += 1
+                return None
+            self._lru.move_to_end(slot)
+            self._counts["hits"] += 1
+            return self._payloads[slot]
+
+    def store(self, q_emb: np.ndarray, payload: bytes, generation) -> None:
+        if not self.capacity:
+            return
+        with self._lock:
+            self._check_generation(generation)
+            if self._vecs is None or self._vecs.shape[1] != q_emb.shape[0]:
+                self._vecs = np.zeros((self.capacity, q_emb.shape[0]), dtype="float32")
+                self._valid[:] = False
+                self._payloads.clear()
+                self._lru.clear()
+            if len(self._lru) < self.capacity:
+                slot = int(np.argmin(self._valid))
+            else:
+                slot, _ = self._lru.popitem(last=False)
+                self._counts["evictions"] += 1
+            self._vecs[slot] = q_emb
+            self._valid[slot] = True
+            self._payloads[slot] = payload
+            self._lru[slot] = None
+            self._lru.move_to_end(slot)
+            self._counts["stores"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._valid[:] = False
+            self._payloads.clear()
+            self._lru.clear()
+
+    def nbytes(self) -> int:
+        """Memory held by the cached vectors and responses."""
+        with self._lock:
+            vecs = self._vecs.nbytes if self._vecs is not None else 0
+            return vecs + sum(len(p) for p in self._payloads.values())
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            looked = self._counts["hits"] + self._counts["misses"]
+            return dict(
+                self._counts,
+                size=len(self._lru),
+                capacity=self.capacity,
+                hit_rate=round(self._counts["hits"] / looked, 4) if looked else 0.0,
+            )
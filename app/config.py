@@ -25,3 +25,104 @@ LEXICAL_THRESHOLD = float(os.getenv("LEX_THRESHOLD", "0.03"))
 
 # Predictable safe fallback message for out-of-scope / insufficient context
 FALLBACK_MESSAGE = "Sorry — I don’t have that information in my FAQ knowledge base. Please rephrase your question or contact support."
+
+# Chunking (approximate token counts; MiniLM truncates inputs around 128 word pieces)
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "120"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "24"))
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+# Ingestion pipeline: parser processes (0 = one per CPU) and chunk segments buffered between stages
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+# Files larger than this are not sent to the parser pool but streamed in the reader thread
+INGEST_POOL_MAX_BYTES = int(os.getenv("INGEST_POOL_MAX_BYTES", str(1 << 20)))
+
+# Near-duplicate chunk collapsing at index time (estimated Jaccard; set to 1.01 to disable)
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+
+# MMR diversity at query time: 1.0 = pure similarity (off); lower values favour distinct chunks
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "1.0"))
+MMR_CANDIDATES = int(os.getenv("MMR_CANDIDATES", "20"))
+
+# Prompt context budget, in LLM tokens for OPENAI_MODEL (tiktoken if installed, else an estimate)
+CONTEXT_TOKENS = int(os.getenv("CONTEXT_TOKENS", "600"))
+
+# Semantic answer cache for the RAG path (0 entries disables it)
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "512"))
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+
+# Two-level retrieval: section centroids (coarse) -> chunks (fine)
+CENTROIDS_PATH = CACHE_DIR / "kb.centroids.npz"
+FACTS_PATH = CACHE_DIR / "kb.facts.json"  # prices, SLA levels, hours, payment split (see app/facts.py)
+COARSE_SECTIONS = int(os.getenv("COARSE_SECTIONS", "0"))  # sections scanned per query; 0 = flat search
+INTENT_FILTER = os.getenv("INTENT_FILTER", "1") == "1"  # search the intent's sources first
+
+# LLM call protection: per-request deadline, concurrency/queue caps and circuit breaker
+LLM_DEADLINE_S = float(os.getenv("LLM_DEADLINE_S", "8"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "8"))
+LLM_BREAKER_WINDOW = int(os.getenv("LLM_BREAKER_WINDOW", "20"))  # recent calls considered
+LLM_BREAKER_FAILURE_RATE = float(os.getenv("LLM_BREAKER_FAILURE_RATE", "0.5"))  # errors + slow calls
+LLM_BREAKER_SLOW_S = float(os.getenv("LLM_BREAKER_SLOW_S", os.getenv("LLM_DEADLINE_S", "8")))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+# Hedging: build the extractive answer while the LLM call runs, use it if the LLM misses the deadline
+LLM_HEDGE = os.getenv("LLM_HEDGE", "1") == "1"
+
+# Sharded retrieval: build_index() writes INDEX_SHARDS shard files (0/1 = unsharded); when
+# SHARD_ADDRS ("host:port,host:port") is set, retrieve() scatters queries to those shard servers.
+INDEX_SHARDS = int(os.getenv("INDEX_SHARDS", "0"))
+SHARD_ADDRS = [a.strip() for a in os.getenv("SHARD_ADDRS", "").split(",") if a.strip()]
+SHARD_TIMEOUT_S = float(os.getenv("SHARD_TIMEOUT_S", "0.5"))
+
+# Index artifacts: a bundle built by scripts/build_index.py --bundle to install at startup,
+# and whether a node without a usable index may embed the KB itself (off by default when
+# a bundle is given: replicas serve the bundle's index, never their own build).
+INDEX_BUNDLE = os.getenv("INDEX_BUNDLE", "")
+INDEX_AUTOBUILD = os.getenv("INDEX_AUTOBUILD", "0" if INDEX_BUNDLE else "1") == "1"
+
+# Request profiler (off by default): keep stack samples of /chat requests slower than
+# PROFILE_SLOW_MS and/or of one request in PROFILE_EVERY_N, as collapsed-stack files.
+PROFILE_SLOW_MS = float(os.getenv("PROFILE_SLOW_MS", "0"))
+PROFILE_EVERY_N = int(os.getenv("PROFILE_EVERY_N", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "50"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR", str(CACHE_DIR / "profiles")))
+
+# Max questions answered per POST /chat/batch (UI prefetch of guided prompts)
+CHAT_BATCH_MAX = int(os.getenv("CHAT_BATCH_MAX", "64"))
+
+# Core FAQ routing: "semantic" = keyword overrides, then nearest core question/alias embedding
+# (per-FAQ thresholds calibrated within [ROUTER_MIN_SIM, ROUTER_MAX_SIM]), then fuzzy matching;
+# "rules" = keyword overrides + fuzzy matching only.
+CORE_ROUTER = os.getenv("CORE_ROUTER", "semantic")
+ROUTER_MIN_SIM = float(os.getenv("ROUTER_MIN_SIM", "0.6"))
+ROUTER_MAX_SIM = float(os.getenv("ROUTER_MAX_SIM", "0.92"))
+ROUTER_MARGIN = float(os.getenv("ROUTER_MARGIN", "0.02"))
+
+# Multi-KB serving: each KBS_DIR/<name>/ with a knowledge_base/ folder (and optional data/ FAQ
+# files) is served next to the default KB, selected per request; its index lives in
+# CACHE_DIR/kbs/<name>/. Loaded indexes and FAQ tables are evicted least-recently-used once
+# their estimated size exceeds KB_MEMORY_BUDGET_MB; the embedding model is shared.
+KBS_DIR = Path(os.getenv("KBS_DIR", str(BASE_DIR / "kbs")))
+KB_MEMORY_BUDGET_MB = float(os.getenv("KB_MEMORY_BUDGET_MB", "1024"))
+
+# KB watcher (off by default): KBs ("default", or e.g. "default,acme") whose knowledge_base/
+# folder is watched (inotify, else mtime/size polling of KB_WATCH_POLL_BATCH files per tick).
+# Edits are debounced and applied with an incremental reindex of the changed files only.
+KB_WATCH = [k.strip() for k in os.getenv("KB_WATCH", "").split(",") if k.strip()]
+KB_WATCH_BACKEND = os.getenv("KB_WATCH_BACKEND", "auto")  # auto | inotify | poll
+KB_WATCH_DEBOUNCE_S = float(os.getenv("KB_WATCH_DEBOUNCE_S", "1.0"))  # quiet time before applying
+KB_WATCH_MAX_DELAY_S = float(os.getenv("KB_WATCH_MAX_DELAY_S", "10"))  # cap during continuous edits
+KB_WATCH_POLL_S = float(os.getenv("KB_WATCH_POLL_S", "0.5"))
+KB_WATCH_POLL_BATCH = int(os.getenv("KB_WATCH_POLL_BATCH", "64"))
+
+# Dimensionality reduction (off by default): with INDEX_PCA_DIM > 0 the build fits a PCA
+# projection (whitened if INDEX_PCA_WHITEN=1) on the chunk vectors and stores/searches them
+# at that width; queries are projected the same way. The top INDEX_PCA_RESCORE candidates are
+# rescored against the full-width vectors, memory-mapped from disk (0 = no rescoring; scores
+# are then projected cosines). See scripts/bench_projection.py for recall vs. dimension.
+INDEX_PCA_DIM = int(os.getenv("INDEX_PCA_DIM", "0"))
+INDEX_PCA_WHITEN = os.getenv("INDEX_PCA_WHITEN", "0") == "1"
+INDEX_PCA_RESCORE = int(os.getenv("INDEX_PCA_RESCORE", "32"))
+PROJECTION_PATH = CACHE_DIR / "kb.projection.npz"
+FULL_VECTORS_PATH = CACHE_DIR / "kb.index.full.npy"
@@ -0,0 +1,75 @@
+from __future__ import annotations
+import re
+import zlib
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# MinHash parameters: NUM_PERM = BANDS * ROWS. 16 bands of 4 rows make pairs with
+# Jaccard >= ~0.8 near-certain LSH candidates, which are then checked against the threshold.
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 31) - 1
+
+_rng = np.random.RandomState(1729)  # fixed seed: signatures must be stable across builds
+_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.uint64)
+_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.uint64)
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+
+def _shingles(text: str, n: int = 3) -> List[str]:
+    toks = _WORD_RE.findall(text.lower())
+    if len(toks) <= n:
+        return [" ".join(toks)] if toks else []
+    return [" ".join(toks[i:i + n]) for i in range(len(toks) - n + 1)]
+
+def minhash(text: str) -> np.ndarray:
+    """MinHash signature (NUM_PERM uint32 values) over word 3-gram shingles."""
+    sh = _shingles(text)
+    if not sh:
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint32)
+    h = np.fromiter((zlib.crc32(s.encode("utf-8")) % _PRIME for s in set(sh)), dtype=np.uint64)
+    # a*h + b stays below 2**63, so uint64 arithmetic never overflows
+    return ((np.outer(h, _A) + _B) % _PRIME).min(axis=0).astype(np.uint32)
+
+
+class NearDuplicateFilter:
+    """Streaming near-duplicate detector (MinHash + LSH banding).
+
+    `add(text)` returns the id of an earlier kept text whose estimated Jaccard similarity is
+    >= `threshold`, or None after registering `text` as a new kept id (0, 1, 2, ... in
+    order). Memory is one signature per kept text, independent of text length.
+    """
+
+    def __init__(self, threshold: float = 0.85):
+        self.threshold = threshold
+        self._sigs: List[np.ndarray] = []
+        self._buckets: Dict[tuple, List[int]] = {}
+
+    def add(self, text: str) -> Optional[int]:
+        sig = minhash(text)
+        keys = [(b, sig[b * ROWS:(b + 1) * ROWS].tobytes()) for b in range(BANDS)]
+        seen = set()
+        for key in keys:
+            for cand in self._buckets.get(key, ()):
+                if cand in seen:
+                    continue
+                seen.add(cand)
+                if float(np.mean(self._sigs[cand] == sig)) >= self.threshold:
+                    return cand
+        self._register(sig, keys)
+        return None
+
+    def register(self, text: str) -> int:
+        """Register `text` as the next kept id without checking it (seeding the filter with
+        chunks an existing index already kept)."""
+        sig = minhash(text)
+        return self._register(sig, [(b, sig[b * ROWS:(b + 1) * ROWS].tobytes()) for b in range(BANDS)])
+
+    def _register(self, sig: np.ndarray, keys: List[tuple]) -> int:
+        new_id = len(self._sigs)
+        self._sigs.append(sig)
+        for key in keys:
+            self._buckets.setdefault(key, []).append(new_id)
+        return new_id
@@ -0,0 +1,209 @@
+from __future__ import annotations
+from pathlib import Path
+from types import MappingProxyType
+import json
+import os
+import re
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence
+
+from .config import FACTS_PATH
+
+_HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+_BULLET_RE = re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+(.*\S)\s*$")
+_AMOUNT_RE = re.compile(r"(?:€|EUR\s?|\$)\s?(\d[\d,.]*)\+?", re.IGNORECASE)
+_SEVERITY_RE = re.compile(
+    r"\bseverity\s*(\d)\s*(?:\(([^)]*)\))?\s*:\s*(?:initial\s+)?response\s+(?:time\s+)?(?:within\s+)?(.+?)\.?$",
+    re.IGNORECASE,
+)
+_DAYS = r"(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*"
+_HOURS_RE = re.compile(rf"\b{_DAYS}\s*(?:to|-|–|—)\s*{_DAYS}\b.*?\d{{1,2}}:\d{{2}}", re.IGNORECASE)
+_SPLIT_RE = re.compile(r"(\d{1,3})\s?%\s+([a-z][\w-]*)", re.IGNORECASE)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+
+# Label words too generic to identify one priced service on their own
+_GENERIC = frozenset({"small", "large", "data", "internal", "session", "project", "build", "the", "and", "for", "first"})
+
+
+def _bold_amounts(value: str) -> str:
+    value = re.sub(r"((?:€|EUR\s?|\$)\s?\d[\d,.]*\+?)", r"**\1**", value)
+    return re.sub(r"\bfree\b", "**free**", value, count=1)
+
+def _severity_name(sev: Mapping) -> str:
+    return f"Severity {sev['level']} ({sev['label']})" if sev.get("label") else f"Severity {sev['level']}"
+
+def _parse_amount(value: str) -> Optional[float]:
+    m = _AMOUNT_RE.search(value)
+    if m:
+        return float(m.group(1).replace(",", "").rstrip("."))
+    return 0.0 if re.search(r"\bfree\b", value, re.IGNORECASE) else None
+
+
+def extract_facts(files: Iterable[Path]) -> Dict:
+    """Structured facts from markdown/text KB files, found by line patterns under headings:
+    price ranges ("- Service: from €N+"), SLA severities, support hours and channels, and
+    percentage payment splits. Only `.md` / `.txt` files are scanned."""
+    facts: Dict = {"prices": [], "severities": [], "support_hours": None, "support_channels": [], "payment_split": None}
+    for path in files:
+        if path.suffix.lower() not in (".md", ".txt"):
+            continue
+        heading = ""
+        with path.open("r", encoding="utf-8", errors="replace") as f:
+            for raw in f:
+                m = _HEADING_RE.match(raw)
+                if m:
+                    heading = m.group(1).lower()
+                    continue
+                b = _BULLET_RE.match(raw)
+                line = (b.group(1) if b else raw).strip()
+                if not line:
+                    continue
+                _scan_line(facts, line, heading, bool(b), path.name)
+    facts["severities"].sort(key=lambda s: s["level"])
+    return facts
+
+def _scan_line(facts: Dict, line: str, heading: str, bullet: bool, source: str) -> None:
+    sev = _SEVERITY_RE.search(line)
+    if sev:
+        facts["severities"].append({
+            "level": int(sev.group(1)), "label": (sev.group(2) or "").strip(),
+            "response": sev.group(3).strip(), "source": source,
+        })
+        return
+    if facts["support_hours"] is None and _HOURS_RE.search(line) and ("hour" in heading or "support" in heading):
+        facts["support_hours"] = {"value": line.rstrip("."), "source": source}
+        return
+    if bullet and "channel" in heading:
+        facts["support_channels"].append({"value": line.rstrip("."), "source": source})
+        return
+    splits = _SPLIT_RE.findall(line)
+    if facts["payment_split"] is None and len(splits) >= 2 and ("milestone" in line.lower() or "payment" in heading):
+        facts["payment_split"] = {
+            "milestones": [{"percent": int(p), "stage": stage.lower()} for p, stage in splits],
+            "source": source,
+        }
+        return
+    if bullet and ":" in line:
+        label, value = (x.strip() for x in line.split(":", 1))
+        amount = _parse_amount(value)
+        pricing_section = any(w in heading for w in ("pric", "range", "cost", "rate"))
+        if amount is not None and label and (_AMOUNT_RE.search(value) or pricing_section):
+            facts["prices"].append({"label": label, "value": value.rstrip("."), "min_eur": amount, "source": source})
+
+def merge_facts(old: Mapping, new: Mapping, replaced: Iterable[str]) -> Dict:
+    """Facts of an incremental rebuild: `old` without the entries from the `replaced` files,
+    plus `new` (extracted from the files re-read). Ordered as a full extraction would be:
+    by file name, and single-valued facts come from the first file that has one."""
+    replaced = set(replaced)
+
+    def kept(key: str) -> List[Dict]:
+        return [x for x in old.get(key) or [] if x["source"] not in replaced] + list(new.get(key) or [])
+
+    def first(key: str) -> Optional[Dict]:
+        found = [new[key]] if new.get(key) else []
+        if old.get(key) and old[key]["source"] not in replaced:
+            found.append(old[key])
+        return min(found, key=lambda x: x["source"]) if found else None
+
+    out = {k: sorted(kept(k), key=lambda x: x["source"]) for k in ("prices", "severities", "support_channels")}
+    out["severities"].sort(key=lambda x: x["level"])
+    out["support_hours"] = first("support_hours")
+    out["payment_split"] = first("payment_split")
+    return out
+
+def write_facts(facts: Dict, path: Path) -> None:
+    path.write_text(json.dumps(facts, ensure_ascii=False, indent=1), encoding="utf-8")
+
+
+class FactTable:
+    """Read-only lookup tables over the extracted facts, with answers rendered once at load."""
+
+    def __init__(self, facts: Mapping, source_bytes: int = 0):
+        # Parsed mappings plus the answers rendered from them: a few times the JSON size
+        self._nbytes = 4 * source_bytes
+        prices = facts.get("prices") or []
+        self.prices = tuple(MappingProxyType(dict(p)) for p in prices)
+        by_token: Dict[str, int] = {}
+        for i, p in enumerate(self.prices):
+            for tok in _WORD_RE.findall(p["label"].lower()):
+                if len(tok) > 2 and tok not in _GENERIC:
+                    by_token.setdefault(tok, i)
+        self._price_by_token = MappingProxyType(by_token)
+        self.price_answers = tuple(
+            f"**Indicative range (non‑binding):** {p['label']}: {_bold_amounts(p['value'])}." for p in self.prices
+        )
+        self.price_list = "\n".join(f"- {p['label']}: {p['value']}" for p in self.prices)
+        self.price_sources = tuple(sorted({p["source"] for p in self.prices}))
+
+        sevs = facts.get("severities") or []
+        self.severities = MappingProxyType({int(s["level"]): MappingProxyType(dict(s)) for s in sevs})
+        label_words: Dict[str, int] = {}
+        for s in sevs:
+            words = _WORD_RE.findall(s["label"].lower())
+            if words:
+                label_words.setdefault(words[0], int(s["level"]))
+        self._severity_by_word = MappingProxyType(label_words)
+        self.severity_answers = MappingProxyType({
+            lvl: f"For **{_severity_name(s)}**, the **initial response time** is within **{s['response']}**."
+            for lvl, s in self.severities.items()
+        })
+        self.sla_list = "\n".join(f"- {_severity_name(s)}: within {s['response']}" for s in self.severities.values())
+
+        hours = facts.get("support_hours")
+        channels = facts.get("support_channels") or []
+        self.support_hours = MappingProxyType(dict(hours)) if hours else None
+        self.hours_answer = None
+        if hours:
+            self.hours_answer = f"Support business hours are **{hours['value']}**."
+            if channels:
+                self.hours_answer += "\n**Channels:** " + ", ".join(c["value"] for c in channels) + "."
+        self.hours_sources = tuple(sorted({x["source"] for x in ([hours] if hours else []) + list(channels)}))
+
+        split = facts.get("payment_split")
+        self.payment_split = MappingProxyType(dict(split)) if split else None
+        self.split_answer = None
+        if split:
+            parts = ", ".join(f"**{m['percent']}%** {m['stage']}" for m in split["milestones"])
+            self.split_answer = f"A typical milestone split is {parts}."
+
+    def nbytes(self) -> int:
+        """Rough resident size (counted in the owning KB's `RESIDENT` entry)."""
+        return self._nbytes
+
+    def price_for(self, tokens: Sequence[str]) -> Optional[int]:
+        """Index of the priced service named by any of `tokens` (first hit wins)."""
+        for tok in tokens:
+            i = self._price_by_token.get(tok)
+            if i is not None:
+                return i
+        return None
+
+    def severity_for(self, tokens: Sequence[str]) -> Optional[int]:
+        for tok in tokens:
+            lvl = self._severity_by_word.get(tok)
+            if lvl is not None:
+                return lvl
+        return None
+
+
+_EMPTY = FactTable({})
+
+def current_facts(path: Path = FACTS_PATH, cached: tuple = (None, _EMPTY)) -> tuple:
+    """(generation, fact table) of the current index build at `path`. `cached`, a previous
+    result, is returned as is unless a reindex replaced the file. Nothing is cached here:
+    callers keep the result in per-KB state, so it is sized and evicted with its KB."""
+    gen = facts_generation(path)
+    if gen is None:
+        return None, _EMPTY
+    if gen == cached[0]:
+        return cached
+    try:
+        text = path.read_text(encoding="utf-8")
+        return gen, FactTable(json.loads(text), len(text))
+    except (OSError, ValueError):
+        return cached  # replaced while we read it: keep the previous table until next time
+
+def facts_generation(path: Path = FACTS_PATH) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
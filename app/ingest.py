@@ -0,0 +1,390 @@
+from __future__ import annotations
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from html.parser import HTMLParser
+from pathlib import Path
+import json
+import multiprocessing
+import os
+import queue
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple
+
+from .config import CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, EMBED_BATCH_SIZE, INGEST_WORKERS, INGEST_QUEUE_SIZE, INGEST_POOL_MAX_BYTES
+
+# File types the ingestion pipeline knows how to parse.
+KB_EXTENSIONS = (".md", ".txt", ".html", ".htm", ".json")
+
+@dataclass
+class Chunk:
+    text: str
+    source: str
+    headings: List[str] = field(default_factory=list)
+    category: str = ""
+
+
+def is_kb_name(name: str) -> bool:
+    # Do NOT index the boundary/scope file (it can pollute retrieval)
+    return Path(name).suffix.lower() in KB_EXTENSIONS and not name.lower().startswith("00_")
+
+def iter_kb_files(kb_dir: Path) -> Iterator[Path]:
+    for p in sorted(kb_dir.iterdir()):
+        if p.is_file() and is_kb_name(p.name):
+            yield p
+
+_HEADING_RE = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_RULE_RE = re.compile(r"^\s{0,3}([-*_])(\s*\1){2,}\s*$")
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+def _count_tokens(text: str) -> int:
+    # Word/punctuation count: a cheap, tokenizer-free proxy for model tokens.
+    return len(_TOKEN_RE.findall(text))
+
+def _iter_blocks(
+    lines: Iterable[str],
+    max_tokens: int = CHUNK_TOKENS,
+    markdown: bool = True,
+) -> Iterator[Tuple[Tuple[str, ...], str, bool]]:
+    """Stream text lines into (heading_path, block, is_heading) tuples.
+
+    A block is a heading line or a paragraph (run of non-blank lines). Paragraphs longer
+    than `max_tokens` are emitted in pieces, so at most one window of text is buffered.
+    With `markdown=False` (plain text), '#' lines are ordinary text.
+    """
+    path: List[Tuple[int, str]] = []
+    buf: List[str] = []
+    used = 0
+    for raw in lines:
+        line = raw.rstrip()
+        m = _HEADING_RE.match(line) if markdown else None
+        if m or not line.strip() or (markdown and _RULE_RE.match(line)):
+            if buf:
+                yield tuple(t for _, t in path), "\n".join(buf), False
+                buf, used = [], 0
+            if m:
+                level = len(m.group(1))
+                while path and path[-1][0] >= level:
+                    path.pop()
+                path.append((level, m.group(2)))
+                yield tuple(t for _, t in path), line.strip(), True
+            continue
+        buf.append(line)
+        used += _count_tokens(line)
+        if used >= max_tokens:
+            yield tuple(t for _, t in path), "\n".join(buf), False
+            buf, used = [], 0
+    if buf:
+        yield tuple(t for _, t in path), "\n".join(buf), False
+
+def _split_long_line(line: str, max_tokens: int, overlap_tokens: int) -> Iterator[str]:
+    """Split one oversized line on word boundaries into overlapping windows."""
+    words = line.split()
+    start = 0
+    while start < len(words):
+        used = 0
+        end = start
+        while end < len(words) and (used == 0 or used + _count_tokens(words[end]) <= max_tokens):
+            used += _count_tokens(words[end])
+            end += 1
+        yield " ".join(words[start:end])
+        if end >= len(words):
+            break
+        back = 0
+        nxt = end
+        while nxt > start + 1 and back + _count_tokens(words[nxt - 1]) <= overlap_tokens:
+            back += _count_tokens(words[nxt - 1])
+            nxt -= 1
+        start = nxt
+
+def _iter_chunks(
+    blocks: Iterable[Tuple[Tuple[str, ...], str, bool]],
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> Iterator[Tuple[Tuple[str, ...], str]]:
+    """Pack blocks into token-bounded chunks that never span a heading.
+
+    Each heading starts a new chunk. Inside a section, lines are packed up to `max_tokens`;
+    the next window repeats whole trailing lines (up to `overlap_tokens`), so overlap never
+    cuts a word or a heading. Yields (heading_path, text).
+    """
+    headings: Tuple[str, ...] = ()
+    buf: List[Tuple[str, int]] = []
+    used = 0
+    has_body = False
+
+    def emit():
+        return headings, "\n".join(ln for ln, _ in buf)
+
+    for path, block, is_heading in blocks:
+        if is_heading:
+            if has_body:
+                yield emit()
+            headings = path
+            n = _count_tokens(block)
+            buf, used, has_body = [(block, n)], n, False
+            continue
+        headings = path
+        for line in block.splitlines():
+            n = _count_tokens(line)
+            pieces = [line] if n <= max_tokens else list(_split_long_line(line, max_tokens, overlap_tokens))
+            for piece in pieces:
+                n = _count_tokens(piece)
+                if has_body and used + n > max_tokens:
+                    yield emit()
+                    tail: List[Tuple[str, int]] = []
+                    back = 0
+                    for ln, k in reversed(buf):
+                        if back + k > overlap_tokens or back + k + n > max_tokens:
+                            break
+                        tail.insert(0, (ln, k))
+                        back += k
+                    buf, used = tail, back
+                buf.append((piece, n))
+                used += n
+                has_body = True
+    if has_body:
+        yield emit()
+
+
+class _HtmlToMarkdown(HTMLParser):
+    """Incremental HTML -> markdown-ish lines (headings, bullets, paragraphs)."""
+    _SKIP = {"script", "style", "head", "noscript", "template"}
+    _BLOCK = {"p", "div", "section", "article", "main", "br", "tr", "table", "ul", "ol", "dl", "dt", "dd", "blockquote", "pre"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.lines: List[str] = []
+        self._buf: List[str] = []
+        self._prefix = ""
+        self._skip = 0
+
+    def _flush(self):
+        text = " ".join("".join(self._buf).split())
+        if text:
+            self.lines.append(self._prefix + text)
+        self._buf = []
+        self._prefix = ""
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip += 1
+        elif re.fullmatch(r"h[1-6]", tag):
+            self._flush()
+            self.lines.append("")
+            self._prefix = "#" * int(tag[1]) + " "
+        elif tag == "li":
+            self._flush()
+            self._prefix = "- "
+        elif tag in self._BLOCK:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip = max(0, self._skip - 1)
+        elif re.fullmatch(r"h[1-6]", tag) or tag in {"p", "ul", "ol", "table", "section", "article"}:
+            self._flush()
+            self.lines.append("")
+        elif tag == "li" or tag in self._BLOCK:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._buf.append(data)
+
+
+def _iter_html_lines(f, read_size: int = 1 << 16) -> Iterator[str]:
+    parser = _HtmlToMarkdown()
+    for piece in iter(lambda: f.read(read_size), ""):
+        parser.feed(piece)
+        yield from parser.lines
+        parser.lines.clear()
+    parser.close()
+    parser._flush()
+    yield from parser.lines
+
+def _iter_json_faq_blocks(path: Path) -> Iterator[Tuple[Tuple[str, ...], str, bool]]:
+    """FAQ exports: a list of {question, answer|reference_answer, category?} objects
+    (optionally wrapped in {"faqs": [...]}, {"items": [...]}). One section per entry."""
+    data = json.loads(path.read_text(encoding="utf-8"))
+    if isinstance(data, dict):
+        data = data.get("faqs") or data.get("items") or data.get("data") or []
+    for it in data if isinstance(data, list) else []:
+        if not isinstance(it, dict) or it.get("in_scope") is False:
+            continue
+        q = str(it.get("question") or it.get("q") or "").strip()
+        a = str(it.get("answer") or it.get("reference_answer") or it.get("a") or "").strip()
+        if not q or not a:
+            continue
+        headings = tuple(x for x in (str(it.get("category") or "").strip(), q) if x)
+        yield headings, f"## {q}", True
+        for block in re.split(r"\n\s*\n", a):
+            if block.strip():
+                yield headings, block.strip(), False
+
+def _chunk_file(p: Path) -> Iterator[Chunk]:
+    """Parse and chunk one KB file lazily (text files are streamed; JSON exports load whole)."""
+    ext = p.suffix.lower()
+    if ext == ".json":
+        chunks = _iter_chunks(_iter_json_faq_blocks(p))
+        f = None
+    else:
+        f = p.open("r", encoding="utf-8", errors="replace")
+        blocks = _iter_blocks(_iter_html_lines(f)) if ext in (".html", ".htm") else _iter_blocks(f, markdown=(ext == ".md"))
+        chunks = _iter_chunks(blocks)
+    try:
+        # Category: the document's top-level heading (FAQ category for JSON exports), else the file stem.
+        for h, text in chunks:
+            yield Chunk(text=text, source=p.name, headings=list(h), category=h[0] if h else p.stem)
+    finally:
+        if f is not None:
+            f.close()
+
+def _parse_file(path: str) -> Tuple[str, List[Chunk]]:
+    """Pool worker: parse and chunk one KB file (at most `INGEST_POOL_MAX_BYTES`)."""
+    p = Path(path)
+    return p.name, list(_chunk_file(p))
+
+def _segments(name: str, chunks: Iterable[Chunk], size: int) -> Iterator[Tuple[str, List[Chunk], bool]]:
+    """(file name, at most `size` chunks, last segment of the file?)"""
+    seg: List[Chunk] = []
+    for c in chunks:
+        seg.append(c)
+        if len(seg) >= size:
+            yield name, seg, False
+            seg = []
+    yield name, seg, True
+
+def _file_size(p: Path) -> int:
+    try:
+        return p.stat().st_size
+    except OSError:
+        return 0  # let the parser report it
+
+
+_DONE = object()
+
+def _produce(files: List[Path], out: "queue.Queue", workers: int, stop: threading.Event, segment_size: int, pool_max_bytes: int) -> None:
+    """Reader stage: parse files in file order and queue their chunks in segments of at
+    most `segment_size`. With workers > 1, files up to `pool_max_bytes` are parsed in a
+    process pool (at most `2 * workers` in flight); larger ones are streamed here, so no
+    whole large file is ever held in memory."""
+    def put(item) -> None:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def put_file(name: str, chunks: Iterable[Chunk]) -> None:
+        for item in _segments(name, chunks, segment_size):
+            if stop.is_set():
+                return
+            put(item)
+
+    try:
+        if workers <= 1 or len(files) <= 1:
+            for p in files:
+                if stop.is_set():
+                    break
+                put_file(p.name, _chunk_file(p))
+        else:
+            # Not fork: the pool may be started from a thread of a multithreaded server.
+            method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method)) as pool:
+                pending: deque = deque()
+
+                def drain(limit: int) -> None:
+                    while len(pending) > limit and not stop.is_set():
+                        put_file(*pending.popleft().result())
+
+                for p in files:
+                    if stop.is_set():
+                        break
+                    if _file_size(p) > pool_max_bytes:
+                        drain(0)  # keep file order
+                        put_file(p.name, _chunk_file(p))
+                        continue
+                    pending.append(pool.submit(_parse_file, str(p)))
+                    drain(2 * workers - 1)
+                drain(0)
+                for fut in pending:
+                    fut.cancel()
+    except BaseException as e:  # surfaced to the consumer
+        put(e)
+    finally:
+        put(_DONE)
+
+def run_ingest(
+    files: Iterable[Path],
+    encode: Callable[[List[Chunk]], "object"],
+    sink: Callable[[List[Chunk], "object"], None],
+    batch_size: int = EMBED_BATCH_SIZE,
+    workers: int = INGEST_WORKERS,
+    queue_size: int = INGEST_QUEUE_SIZE,
+    pool_max_bytes: int = INGEST_POOL_MAX_BYTES,
+    progress: Callable[[Dict[str, float]], None] | None = None,
+    keep: Callable[[Chunk], bool] | None = None,
+) -> Dict[str, float]:
+    """Staged ingestion: parallel read/parse -> chunk -> batched embed -> sink.
+
+    Parsed chunks flow to the embedding stage in segments of at most `batch_size` through a
+    bounded queue, so a slow embedder applies backpressure to the readers instead of
+    buffering the whole KB (or a whole large file). `encode` maps a
+    batch of chunks to vectors; `sink` receives each (batch, vectors) pair as it is ready.
+    `progress`, if given, is called with running stats after every batch. `keep`, if given,
+    filters chunks before they are embedded (e.g. near-duplicate removal).
+    """
+    files = list(files)
+    workers = workers or (os.cpu_count() or 1)
+    stats: Dict[str, float] = {"docs": 0, "chunks": 0, "duplicates": 0, "seconds": 0.0, "files_per_s": 0.0, "chunks_per_s": 0.0}
+    t0 = time.perf_counter()
+
+    def report(notify: bool = True) -> None:
+        dt = max(time.perf_counter() - t0, 1e-9)
+        stats["seconds"] = round(dt, 3)
+        stats["files_per_s"] = round(stats["docs"] / dt, 2)
+        stats["chunks_per_s"] = round(stats["chunks"] / dt, 2)
+        if notify and progress is not None:
+            progress(dict(stats, total_docs=len(files)))
+
+    def flush(batch: List[Chunk]) -> None:
+        sink(batch, encode(batch))
+        stats["chunks"] += len(batch)
+        report()
+
+    q: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+    stop = threading.Event()
+    reader = threading.Thread(
+        target=_produce, args=(files, q, workers, stop, max(1, batch_size), pool_max_bytes), name="kb-ingest-reader", daemon=True,
+    )
+    reader.start()
+
+    batch: List[Chunk] = []
+    try:
+        while True:
+            item = q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            _name, chunks, last = item
+            stats["docs"] += last
+            for c in chunks:
+                if keep is not None and not keep(c):
+                    stats["duplicates"] += 1
+                    continue
+                batch.append(c)
+                if len(batch) >= batch_size:
+                    flush(batch)
+                    batch = []
+        if batch:
+            flush(batch)
+    finally:
+        stop.set()
+        reader.join()
+    report(notify=not stats["chunks"])
+    return stats
@@ -0,0 +1,146 @@
+from __future__ import annotations
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import re
+import threading
+from typing import Callable, Dict, Hashable, List, Optional, Tuple, TypeVar
+
+from .config import CACHE_DIR, CENTROIDS_PATH, FACTS_PATH, FULL_VECTORS_PATH, INDEX_PATH, KB_DIR, KB_MEMORY_BUDGET_MB, KBS_DIR, META_PATH
+from .config import PROJECTION_PATH
+from .artifacts import MANIFEST_NAME
+
+T = TypeVar("T")
+
+_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
+
+@dataclass(frozen=True)
+class KB:
+    """One servable knowledge base: its source files, FAQ tables and index artifacts."""
+    name: str
+    kb_dir: Path
+    data_dir: Path
+    cache_dir: Path
+
+    @property
+    def index_path(self) -> Path:
+        return self.cache_dir / INDEX_PATH.name
+
+    @property
+    def emb_path(self) -> Path:
+        return self.index_path.with_suffix(".npy")
+
+    @property
+    def meta_path(self) -> Path:
+        return self.cache_dir / META_PATH.name
+
+    @property
+    def centroids_path(self) -> Path:
+        return self.cache_dir / CENTROIDS_PATH.name
+
+    @property
+    def facts_path(self) -> Path:
+        return self.cache_dir / FACTS_PATH.name
+
+    @property
+    def projection_path(self) -> Path:
+        return self.cache_dir / PROJECTION_PATH.name
+
+    @property
+    def full_path(self) -> Path:
+        return self.cache_dir / FULL_VECTORS_PATH.name
+
+    @property
+    def manifest_path(self) -> Path:
+        return self.cache_dir / MANIFEST_NAME
+
+    @property
+    def faq_path(self) -> Path:
+        return self.data_dir / "faq_complete.json"
+
+    @property
+    def alias_path(self) -> Path:
+        return self.data_dir / "faq_aliases.json"
+
+
+# The repo's own KB; FAQ files are read relative to the working directory, as before.
+DEFAULT_KB = KB("default", KB_DIR, Path("data"), CACHE_DIR)
+
+
+def get_kb(name: Optional[str] = None) -> KB:
+    """KB `name` (None / "default" = the built-in one). Raises KeyError for unknown names."""
+    if not name or name == DEFAULT_KB.name:
+        return DEFAULT_KB
+    if not _NAME_RE.match(name) or not (KBS_DIR / name / "knowledge_base").is_dir():
+        raise KeyError(name)
+    root = KBS_DIR / name
+    return KB(name, root / "knowledge_base", root / "data", CACHE_DIR / "kbs" / name)
+
+def available_kbs() -> List[str]:
+    names = [DEFAULT_KB.name]
+    if KBS_DIR.is_dir():
+        names += sorted(p.name for p in KBS_DIR.iterdir() if _NAME_RE.match(p.name) and (p / "knowledge_base").is_dir())
+    return names
+
+
+class ResidentSet:
+    """Loaded per-KB objects (indexes, FAQ tables), evicted least-recently-used once their
+    estimated sizes add up to more than `budget_bytes`.
+
+    `get()` returns the resident value for `key`, or loads it. `size(value)` is re-evaluated
+    on every eviction pass, so objects that grow after loading (caches) are accounted for.
+    The entry just used is never evicted, even if it alone exceeds the budget. Evicted
+    values stay valid for requests that still hold them; they are simply not cached.
+    """
+
+    def __init__(self, budget_bytes: float):
+        self.budget = budget_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[object, Callable[[object], int]]]" = OrderedDict()
+        self._counts = {"loads": 0, "evictions": 0}
+
+    def peek(self, key: Hashable) -> Optional[object]:
+        """Resident value for `key` (no load, no recency update)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry[0] if entry is not None else None
+
+    def get(self, key: Hashable, load: Callable[[], T], size: Callable[[T], int], valid: Callable[[T], bool] | None = None) -> T:
+        """Resident value for `key` if it is still `valid`, else `load()` it. Callers
+        serialize loads of the same key themselves (a per-KB lock)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (valid is None or valid(entry[0])):
+                self._entries.move_to_end(key)
+                return entry[0]
+        value = load()
+        with self._lock:
+            self._entries[key] = (value, size)
+            self._entries.move_to_end(key)
+            self._counts["loads"] += 1
+            self._evict()
+        return value
+
+    def _evict(self) -> None:
+        total = sum(size(v) for v, size in self._entries.values())
+        while total > self.budget and len(self._entries) > 1:
+            _key, (value, size) = self._entries.popitem(last=False)
+            total -= size(value)
+            self._counts["evictions"] += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            resident = [{"key": "/".join(map(str, k)) if isinstance(k, tuple) else str(k), "bytes": int(size(v))} for k, (v, size) in self._entries.items()]
+            return dict(self._counts, budget_bytes=int(self.budget), bytes=sum(r["bytes"] for r in resident), resident=resident)
+
+
+RESIDENT = ResidentSet(KB_MEMORY_BUDGET_MB * 2**20)
+
+_LOCKS: Dict[Hashable, threading.Lock] = {}
+_LOCKS_GUARD = threading.Lock()
+
+def kb_lock(key: Hashable) -> threading.Lock:
+    """One loading lock per key, so a slow load (or autobuild) of one KB does not block others."""
+    with _LOCKS_GUARD:
+        return _LOCKS.setdefault(key, threading.Lock())
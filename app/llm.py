@@ -1,7 +1,16 @@
 from __future__ import annotations
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
 import os
+import threading
+import time
+from typing import Dict, Tuple
 
 from .config import OPENAI_MODEL, OLLAMA_MODEL, FALLBACK_MESSAGE
+from .config import (
+    LLM_DEADLINE_S, LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_BREAKER_WINDOW, LLM_BREAKER_FAILURE_RATE,
+    LLM_BREAKER_SLOW_S, LLM_BREAKER_COOLDOWN_S,
+)
 
 SYSTEM_PROMPT_V1 = """You are an FAQ assistant for ARV Digital Services.
 Answer the user's question using the provided CONTEXT.
@@ -35,9 +44,10 @@ def _extract_sources(context: str) -> list[str]:
     srcs = []
     for line in context.splitlines():
         if line.startswith("[SOURCE:"):
-            s = line.replace("[SOURCE:", "").replace("]", "").strip()
-            if s and s not in srcs:
-                srcs.append(s)
+            for s in line.replace("[SOURCE:", "").replace("]", "").split(","):
+                s = s.strip()
+                if s and s not in srcs:
+                    srcs.append(s)
     return srcs
 
 def _extractive_answer(context: str) -> str:
@@ -45,51 +55,185 @@ def _extractive_answer(context: str) -> str:
     lines = [ln for ln in lines if not ln.startswith("[SOURCE:")]
     return "\n".join(lines[:8]).strip()
 
-def generate_answer(question: str, context: str, sources: list[str] | None = None) -> str:
-    if _openai_available():
+class CircuitBreaker:
+    """Trips when the failure rate (errors + calls slower than `slow_s`) over the last
+    `window` calls reaches `failure_rate`. While open, calls are refused for `cooldown_s`;
+    then one trial call is let through (half-open) and its outcome closes or re-opens it.
+    Outcomes of calls started before the trip (stragglers) do not count."""
+
+    def __init__(self, window: int, failure_rate: float, slow_s: float, cooldown_s: float, min_calls: int = 5):
+        self.window = max(1, window)
+        self.failure_rate = failure_rate
+        self.slow_s = slow_s
+        self.cooldown_s = cooldown_s
+        self.min_calls = min(min_calls, self.window)
+        self._lock = threading.Lock()
+        self._outcomes: deque = deque(maxlen=self.window)
+        self._opened_at: float | None = None
+        self._trial = False
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> str | None:
+        """Admit one call: "closed", "trial" (the half-open trial; pass `trial=True` to
+        `record()`), or None if it must be refused. Call only once the call will run."""
+        with self._lock:
+            st = self._state()
+            if st == "closed":
+                return "closed"
+            if st == "half_open" and not self._trial:
+                self._trial = True
+                return "trial"
+            return None
+
+    def record(self, ok: bool, latency_s: float, trial: bool = False) -> None:
+        failed = (not ok) or latency_s > self.slow_s
+        with self._lock:
+            if self._opened_at is not None:
+                # Only the trial's outcome closes or re-opens; stragglers from before the trip are ignored.
+                if trial and self._trial:
+                    self._trial = False
+                    if failed:
+                        self._opened_at = time.monotonic()
+                    else:
+                        self._opened_at = None
+                        self._outcomes.clear()
+                return
+            self._outcomes.append(failed)
+            n = len(self._outcomes)
+            if n >= self.min_calls and sum(self._outcomes) / n >= self.failure_rate:
+                self._opened_at = time.monotonic()
+                self._outcomes.clear()
+                self.trips += 1
+
+
+class _LLMGate:
+    """Admission control for provider calls: at most `LLM_MAX_CONCURRENCY` running and
+    `LLM_MAX_QUEUE` waiting; anything beyond is refused immediately instead of piling up
+    request threads."""
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, LLM_MAX_CONCURRENCY), thread_name_prefix="llm")
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.breaker = CircuitBreaker(LLM_BREAKER_WINDOW, LLM_BREAKER_FAILURE_RATE, LLM_BREAKER_SLOW_S, LLM_BREAKER_COOLDOWN_S)
+        self._counts = {"submitted": 0, "ok": 0, "errors": 0, "timeouts": 0, "rejected": 0, "breaker_open": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._counts[key] += 1
+
+    def submit(self, question: str, context: str) -> Tuple[Future | None, str]:
+        if not (_openai_available() or _ollama_available()):
+            return None, "disabled"
+        # Reserve a slot first: the breaker's half-open trial is only taken by a call that runs.
+        with self._lock:
+            if self._pending >= max(1, LLM_MAX_CONCURRENCY) + max(0, LLM_MAX_QUEUE):
+                self._counts["rejected"] += 1
+                return None, "rejected"
+            self._pending += 1
+        admitted = self.breaker.allow()
+        with self._lock:
+            if admitted is None:
+                self._pending -= 1
+                self._counts["breaker_open"] += 1
+                return None, "breaker_open"
+            self._counts["submitted"] += 1
+        return self._pool.submit(self._run, question, context, admitted == "trial"), "submitted"
+
+    def _run(self, question: str, context: str, trial: bool = False) -> str:
+        t0 = time.monotonic()
+        ok = False
         try:
-            from openai import OpenAI
-            client = OpenAI()
-            try:
-                resp = client.responses.create(
-                    model=OPENAI_MODEL,
-                    input=[
-                        {"role": "system", "content": SYSTEM_PROMPT},
-                        {"role": "user", "content": f"QUESTION: {question}\n\nCONTEXT:\n{context}"},
-                    ],
-                    temperature=0,
-                )
-                txt = getattr(resp, "output_text", None)
-                if txt:
-                    return txt.strip()
-            except Exception:
-                pass
-
-            chat = client.chat.completions.create(
-                model=OPENAI_MODEL,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": f"QUESTION: {question}\n\nCONTEXT:\n{context}"},
-                ],
-                temperature=0,
-            )
-            return chat.choices[0].message.content.strip()
-        except Exception:
-            pass
+            txt = _call_providers(question, context)
+            ok = True
+            return txt
+        finally:
+            self.breaker.record(ok, time.monotonic() - t0, trial=trial)
+            self._count("ok" if ok else "errors")
+            with self._lock:
+                self._pending -= 1
 
-    if _ollama_available():
+    def wait(self, fut: Future, timeout: float) -> Tuple[str, str]:
         try:
-            import ollama
-            r = ollama.chat(
-                model=OLLAMA_MODEL,
-                messages=[
-                    {"role": "system", "content": SYSTEM_PROMPT},
-                    {"role": "user", "content": f"QUESTION: {question}\n\nCONTEXT:\n{context}"},
-                ],
-                options={"temperature": 0},
-            )
-            return r["message"]["content"].strip()
+            return (fut.result(timeout=max(0.0, timeout)) or "").strip(), "ok"
+        except FuturesTimeout:
+            self._count("timeouts")
+            return "", "timeout"
         except Exception:
-            pass
-    # No LLM provider configured -> return empty so the backend can use extractive answer logic.
+            return "", "error"
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counts, pending=self._pending, breaker=self.breaker.state, breaker_trips=self.breaker.trips)
+
+
+def _messages(question: str, context: str) -> list:
+    return [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": f"QUESTION: {question}\n\nCONTEXT:\n{context}"},
+    ]
+
+def _call_openai(question: str, context: str) -> str:
+    from openai import OpenAI
+    client = OpenAI(timeout=LLM_DEADLINE_S, max_retries=0)
+    try:
+        resp = client.responses.create(model=OPENAI_MODEL, input=_messages(question, context), temperature=0)
+        txt = getattr(resp, "output_text", None)
+        if txt:
+            return txt.strip()
+    except Exception:
+        pass
+
+    chat = client.chat.completions.create(model=OPENAI_MODEL, messages=_messages(question, context), temperature=0)
+    return chat.choices[0].message.content.strip()
+
+def _call_ollama(question: str, context: str) -> str:
+    import ollama
+    client = ollama.Client(timeout=LLM_DEADLINE_S)
+    r = client.chat(model=OLLAMA_MODEL, messages=_messages(question, context), options={"temperature": 0})
+    return r["message"]["content"].strip()
+
+def _call_providers(question: str, context: str) -> str:
+    """Try OpenAI, then Ollama. Raises if every configured provider failed."""
+    error: Exception | None = None
+    for available, call in ((_openai_available, _call_openai), (_ollama_available, _call_ollama)):
+        if not available():
+            continue
+        try:
+            return call(question, context)
+        except Exception as e:
+            error = e
+    if error is not None:
+        raise error
     return ""
+
+LLM_GATE = _LLMGate()
+
+def submit_answer(question: str, context: str) -> Tuple[Future | None, str]:
+    """Start an LLM answer in the background. Returns (future, status); the future is None
+    when no provider is configured ("disabled"), the breaker is open ("breaker_open") or
+    the queue is full ("rejected")."""
+    return LLM_GATE.submit(question, context)
+
+def wait_answer(fut: Future, timeout: float) -> Tuple[str, str]:
+    """Wait up to `timeout` seconds. Returns (text, "ok") or ("", "timeout" | "error")."""
+    return LLM_GATE.wait(fut, timeout)
+
+def generate_answer(question: str, context: str, sources: list[str] | None = None, timeout: float = LLM_DEADLINE_S) -> str:
+    fut, _status = submit_answer(question, context)
+    if fut is None:
+        # No LLM available -> return empty so the backend can use extractive answer logic.
+        return ""
+    return wait_answer(fut, timeout)[0]
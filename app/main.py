@@ -1,44 +1,71 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
 import json
 from pathlib import Path
+from types import MappingProxyType
+from typing import List, Optional, Tuple
 import difflib
+import hashlib
 import re
+import time
 
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-from .config import FALLBACK_MESSAGE
-from .rag import retrieve, should_fallback, format_context, build_index, answer_from_chunks, rerank_chunks
-from .llm import generate_answer
-
+from .assets import IMMUTABLE, REVALIDATE, AssetTable, asset_response
+from .cache import SemanticCache
+from .singleflight import SingleFlight
+from .profiler import RequestProfiler
+from .facts import FactTable, current_facts, facts_generation
+from .suggest import SuggestIndex
+from .router import SemanticRouter, faq_examples
+from .watcher import KBWatcher
+from .kbs import DEFAULT_KB, KB, RESIDENT, available_kbs, get_kb, kb_lock
+from . import shards
+from .config import FALLBACK_MESSAGE, SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_THRESHOLD, INTENT_FILTER
+from .config import LLM_DEADLINE_S, LLM_HEDGE, CHAT_BATCH_MAX
+from .config import CORE_ROUTER, ROUTER_MIN_SIM, ROUTER_MAX_SIM, ROUTER_MARGIN
+from .config import PROFILE_DIR, PROFILE_SLOW_MS, PROFILE_EVERY_N, PROFILE_INTERVAL_MS, PROFILE_KEEP
+from .config import KB_WATCH, KB_WATCH_BACKEND, KB_WATCH_DEBOUNCE_S, KB_WATCH_MAX_DELAY_S, KB_WATCH_POLL_S, KB_WATCH_POLL_BATCH
+from .rag import (
+    retrieve, should_fallback, format_context, build_index, answer_from_chunks, rerank_chunks, chunk_sources,
+    embed_query, embed_texts, kb_generation, kb_version, detect_sources, prepare_index, index_info, load_kb,
+    update_index,
+)
+from .llm import submit_answer, wait_answer, LLM_GATE
+
+
+def _read_json_list(path: Path) -> list:
+    if path.exists():
+        try:
+            return json.loads(path.read_text(encoding="utf-8"))
+        except Exception:
+            return []
+    return []
+
+def _load_faq(kb: KB, max_id: Optional[int] = None):
+    """In-scope core FAQ items and aliases of `kb` as read-only views (request handlers share
+    them across threadpool workers), plus a version that changes with the files."""
+    items = tuple(
+        MappingProxyType(dict(x)) for x in _read_json_list(kb.faq_path)
+        if x.get("in_scope") is True and (max_id is None or int(x.get("id", 0)) <= max_id)
+    )
+    aliases = tuple(MappingProxyType(dict(a)) for a in _read_json_list(kb.alias_path))
+    version = hashlib.sha1(b"".join(p.read_bytes() for p in (kb.faq_path, kb.alias_path) if p.exists())).hexdigest()[:8]
+    return items, aliases, version
 
 # Load the 12 core FAQ items (reference answers). These provide stable, question-focused responses.
-FAQ_PATH = Path("data/faq_complete.json")
-_FAQ_ITEMS = []
-if FAQ_PATH.exists():
-    try:
-        _FAQ_ITEMS = json.loads(FAQ_PATH.read_text(encoding="utf-8"))
-    except Exception:
-        _FAQ_ITEMS = []
-FAQ_ITEMS = [x for x in _FAQ_ITEMS if x.get("in_scope") is True and int(x.get("id", 0)) <= 12]
 # Optional alias map to capture common paraphrases/typos and short queries.
-ALIAS_PATH = Path("data/faq_aliases.json")
-_ALIASES = []
-if ALIAS_PATH.exists():
-    try:
-        _ALIASES = json.loads(ALIAS_PATH.read_text(encoding="utf-8"))
-    except Exception:
-        _ALIASES = []
-ALIASES = _ALIASES
+FAQ_PATH = DEFAULT_KB.faq_path
+ALIAS_PATH = DEFAULT_KB.alias_path
+FAQ_ITEMS, ALIASES, _FAQ_VERSION = _load_faq(DEFAULT_KB, max_id=12)
+_CORE_BY_ID = MappingProxyType({int(it.get("id", 0)): it for it in FAQ_ITEMS})
 
 def _core_by_id(core_id: int):
-    for it in FAQ_ITEMS:
-        if int(it.get("id", 0)) == int(core_id):
-            return it
-    return None
+    return _CORE_BY_ID.get(int(core_id))
 
 
 def _norm_q(s: str) -> str:
@@ -117,6 +144,9 @@ def route_core_by_keywords(question: str):
     # Services / discovery
     if q in {"service", "services"} or "what services" in q:
         return _core_by_id(1)
+    words = set(re.findall(r"[a-z0-9]+", q))
+    if "discovery" in q and (any(x in q for x in ["happens after", "step by step"]) or words & {"next", "steps"}):
+        return _core_by_id(6)  # what follows Discovery is the engagement process
     if "discovery" in q and any(x in q for x in ["include", "included", "deliver", "deliverable", "end", "after the discovery", "after discovery"]):
         return _core_by_id(2)
 
@@ -156,15 +186,22 @@ def route_core_by_keywords(question: str):
     return None
 
 
-def answer_pricing_ranges(question: str):
+# Query words that name a priced service without appearing in its KB label
+_SERVICE_SYNONYMS = {"dashboards": "dashboard", "analytics": "dashboard", "chatbots": "chatbot", "bot": "chatbot", "automation": "chatbot"}
+
+def answer_pricing_ranges(question: str, st: Optional["KBState"] = None):
     """
     Returns an indicative range answer if the user asks about cost for a known service.
-    Uses only pricing.md (non-binding guidance).
+    Ranges come from the fact table extracted from the KB at index time (non-binding guidance).
     """
+    st = st or kb_state()
     q = _norm_q(question)
     wants_cost = any(x in q for x in ["how much", "cost", "price", "quote", "budget", "rate", "pricing for"]) and not any(x in q for x in ["pricing model", "pricing models", "price model", "price models"])
     if not wants_cost:
         return None
+    facts = st.facts()
+    if not facts.prices:
+        return None  # no index yet: let retrieval answer
 
     # If user asks for an "exact price list" — KB doesn't have that.
     if any(x in q for x in ["exact price", "price list", "full price list", "per service", "all services"]):
@@ -173,33 +210,23 @@ def answer_pricing_ranges(question: str):
                 "The FAQ knowledge base does not include an exact per‑service price list. "
                 "It only provides **indicative, non‑binding ranges**.\n\n"
                 "**Indicative ranges (non‑binding):**\n"
-                "- Discovery: free for the first session\n"
-                "- Small MVP: from €1,200+ (scope‑dependent)\n"
-                "- Data dashboard: from €800+\n"
-                "- Internal RAG chatbot: from €1,500+\n\n"
+                f"{facts.price_list}\n\n"
                 "If you share what you want to build, I can point you to the closest range and the best pricing model."
             ),
-            "sources": ["pricing.md"],
+            "sources": list(facts.price_sources),
             "confidence": 0.75,
             "is_fallback": False,
             "mode": "grounded",
         }
 
     # Specific services
-    if "mvp" in q:
-        ans = "**Indicative range (non‑binding):** Small MVP is from **€1,200+** (scope‑dependent)."
-        return {"answer": ans, "sources": ["pricing.md"], "confidence": 0.75, "is_fallback": False, "mode": "grounded"}
-    if any(x in q for x in ["dashboard", "dashboards", "data analytics"]):
-        ans = "**Indicative range (non‑binding):** Data dashboard projects are from **€800+**."
-        return {"answer": ans, "sources": ["pricing.md"], "confidence": 0.75, "is_fallback": False, "mode": "grounded"}
-    if any(x in q for x in ["rag", "chatbot", "internal bot", "internal chatbot", "automation"]):
-        ans = "**Indicative range (non‑binding):** Internal RAG chatbot/automation projects are from **€1,500+**."
-        return {"answer": ans, "sources": ["pricing.md"], "confidence": 0.75, "is_fallback": False, "mode": "grounded"}
-    if "discovery" in q:
-        ans = "**Indicative range (non‑binding):** The first Discovery session is **free**."
-        return {"answer": ans, "sources": ["pricing.md"], "confidence": 0.75, "is_fallback": False, "mode": "grounded"}
-
-    # Ambiguous cost question: ask to clarify (still in-scope)
+    i = facts.price_for([_SERVICE_SYNONYMS.get(t, t) for t in re.findall(r"[a-z0-9]+", q)])
+    if i is not None:
+        return {"answer": facts.price_answers[i], "sources": [facts.prices[i]["source"]], "confidence": 0.75, "is_fallback": False, "mode": "grounded"}
+
+    # Ambiguous cost question: ask to clarify (still in-scope; the default KB's services)
+    if not st.builtin_rules:
+        return None
     service_hints = ["discovery", "mvp", "dashboard", "dashboards", "rag", "chatbot", "automation", "support", "maintenance"]
     mentions_model = any(x in q for x in ["fixed price", "time & materials", "time and materials", "t&m", "t & m"])
     if wants_cost and (not any(h in q for h in service_hints)) and (not mentions_model):
@@ -208,12 +235,9 @@ def answer_pricing_ranges(question: str):
                 "I can help with pricing, but I need one detail: **which service** are you asking about "
                 "(Discovery, MVP Build, dashboard, internal RAG chatbot, or maintenance/support)?\n\n"
                 "**Indicative ranges (non‑binding):**\n"
-                "- Discovery: free for the first session\n"
-                "- Small MVP: from €1,200+ (scope‑dependent)\n"
-                "- Data dashboard: from €800+\n"
-                "- Internal RAG chatbot: from €1,500+"
+                f"{facts.price_list}"
             ),
-            "sources": ["pricing.md"],
+            "sources": list(facts.price_sources),
             "confidence": 0.55,
             "is_fallback": True,
             "mode": "clarify",
@@ -221,26 +245,86 @@ def answer_pricing_ranges(question: str):
 
     return None
 
-def match_core_faq(question: str):
+_SEVERITY_RE = re.compile(r"\b(?:severity|sev|priority|p)\s*-?\s*([1-9])\b")
+
+def _states(answer: str, values) -> bool:
+    """True if the curated `answer` already states every one of `values`."""
+    return answer is not None and all(v.lower() in answer for v in values)
+
+def answer_facts(question: str, st: Optional["KBState"] = None, covered: Optional[str] = None):
+    """SLA levels, support hours and the milestone payment split, answered from the fact
+    table extracted at index time (no retrieval). Returns None for other questions.
+
+    `covered` is the reference answer of the core FAQ the question matched, if any: a fact
+    answer is only given where it states something that answer does not (another severity
+    level, the full SLA list), so curated core answers are never replaced."""
+    facts = (st or kb_state()).facts()
+    q = _norm_q(question)
+    words = re.findall(r"[a-z0-9]+", q)
+    covered = covered.lower() if covered is not None else None
+
+    asks_sla = any(x in q for x in ["sla", "response time", "respond", "how fast", "how quickly", "how soon", "severity"])
+    if facts.severities and asks_sla:
+        m = _SEVERITY_RE.search(q)
+        lvl = int(m.group(1)) if m else facts.severity_for(words)
+        if lvl in facts.severity_answers and not _states(covered, [f"severity {lvl}", facts.severities[lvl]["response"]]):
+            src = facts.severities[lvl]["source"]
+            return {"answer": facts.severity_answers[lvl], "sources": [src], "confidence": 0.9, "is_fallback": False, "mode": "grounded"}
+        if m is None and any(x in q for x in ["sla levels", "response times", "severity levels", "all severities"]) and not _states(covered, [f"severity {n}" for n in facts.severities]):
+            srcs = sorted({s["source"] for s in facts.severities.values()})
+            return {"answer": "**SLA levels (initial response time):**\n" + facts.sla_list, "sources": srcs, "confidence": 0.9, "is_fallback": False, "mode": "grounded"}
+
+    if (
+        facts.hours_answer and "support" in q and any(x in words for x in ["hours", "hour", "open", "available", "when"])
+        and not _states(covered, re.findall(r"\d{1,2}:\d{2}", facts.support_hours["value"]))
+    ):
+        return {"answer": facts.hours_answer, "sources": list(facts.hours_sources), "confidence": 0.9, "is_fallback": False, "mode": "grounded"}
+
+    if (
+        facts.split_answer and any(x in q for x in ["milestone", "split", "upfront", "up front", "deposit", "percent", "%", "installment", "payment schedule"])
+        and not _states(covered, [f"{m['percent']}%" for m in facts.payment_split["milestones"]])
+    ):
+        src = facts.payment_split["source"]
+        return {"answer": facts.split_answer, "sources": [src], "confidence": 0.9, "is_fallback": False, "mode": "grounded"}
+
+    return None
+
+def match_core_faq(question: str, st: Optional["KBState"] = None):
     """
-    Try to map the user's question to one of the 12 core FAQ items.
+    Try to map the user's question to one of the core FAQ items of the KB (`st`, default KB).
+    Returns (item, match_score) or None; the shared item is never modified.
     Priority:
-      1) deterministic keyword routing (handles short inputs like 'pricing', 'support', etc.)
-      2) alias routing (common paraphrases/typos)
-      3) fuzzy match over the 12 core questions
+      1) deterministic keyword routing (explicit overrides; short inputs like 'pricing', 'support', etc.)
+         -- default KB only, the rules name its 12 core FAQs
+      2) semantic router: nearest core question / alias embedding, per-FAQ thresholds
+      3) alias + fuzzy string matching (typos the embedding misses)
     """
+    st = st or kb_state()
     # 1) keyword routing
-    item = route_core_by_keywords(question)
-    if item is not None:
-        item["_match_score"] = 0.95
-        return item
-
+    if st.builtin_rules:
+        item = route_core_by_keywords(question)
+        if item is not None:
+            return item, 0.95
+
+    # 2) semantic router
+    if CORE_ROUTER == "semantic":
+        hit = core_router(st).route(embed_query(_norm_q(question)))
+        if hit is not None:
+            it = st.by_id.get(hit[0])
+            if it is not None:
+                return it, hit[1]
+
+    return _match_core_fuzzy(question, st)
+
+def _match_core_fuzzy(question: str, st: Optional["KBState"] = None):
+    """Alias routing (common paraphrases/typos), then fuzzy match over the core questions."""
+    st = st or kb_state()
     qn = _norm_q(question)
 
-    # 2) aliases
+    # aliases
     best_alias = None
     best_alias_score = 0.0
-    for a in ALIASES:
+    for a in st.aliases:
         alias = a.get("alias", "")
         if not alias:
             continue
@@ -249,15 +333,14 @@ def match_core_faq(question: str):
             best_alias_score = sc
             best_alias = a
     if best_alias is not None and best_alias_score >= 0.78:
-        it = _core_by_id(int(best_alias.get("core_id", 0)))
+        it = st.by_id.get(int(best_alias.get("core_id", 0)))
         if it is not None:
-            it["_match_score"] = best_alias_score
-            return it
+            return it, best_alias_score
 
-    # 3) fuzzy match over core questions (last resort)
+    # fuzzy match over core questions (last resort)
     best = None
     best_score = 0.0
-    for it in FAQ_ITEMS:
+    for it in st.items:
         q = it.get("question", "")
         if not q:
             continue
@@ -267,324 +350,411 @@ def match_core_faq(question: str):
             best = it
 
     if best is not None and best_score >= 0.84:
-        best["_match_score"] = best_score
-        return best
+        return best, best_score
     return None
 
-    qn = _norm_q(question)
-    if not qn:
-        return None
-
-    core_norms = [(_norm_q(it.get("question", "")), it) for it in FAQ_ITEMS]
-
-    # 1) Exact match
-    for cn, it in core_norms:
-        if cn and cn == qn:
-            it["_match_score"] = 1.0
-            return it
-
-    q = qn  # normalized
+def core_router(st: Optional["KBState"] = None) -> SemanticRouter:
+    """Semantic router over core questions + aliases, embedded once with the RAG model."""
+    st = st or kb_state()
+    if st.router is None:
+        st.router = SemanticRouter(
+            faq_examples(st.items, st.aliases, _norm_q), embed_texts,
+            min_sim=ROUTER_MIN_SIM, max_sim=ROUTER_MAX_SIM, margin=ROUTER_MARGIN,
+        )
+    return st.router
+
+def answer_static(question: str, st: Optional["KBState"] = None):
+    """Answer from the deterministic tiers (24/7 note, out-of-scope guard, KB fact table,
+    core FAQ routing). Returns a response payload dict, or None to fall through to RAG."""
+    st = st or kb_state()
+    q_lower = question.lower().strip()
+
+    # Special-case: '24/7' queries should be explicit and not dump unrelated SLA details.
+    if st.builtin_rules and any(x in q_lower for x in ["24/7", "24x7"]):
+        return {
+            "answer": "The knowledge base lists business hours (Mon–Fri, 09:00–17:00 CET/CEST) and does not mention 24/7 support.",
+            "sources": ["support.md"],
+            "confidence": 0.5,
+            "is_fallback": False,
+            "mode": "grounded",
+        }
 
-    # Quick out-of-scope guardrails: do not force-route these to core.
-    out_scope_markers = ["bitcoin", "btc", "medical", "headache", "legal contract", "contract", "phone number", "address"]
-    if any(m in q for m in out_scope_markers):
-        return None
+    # Hard out-of-scope guard: do not answer from retrieval.
+    if is_out_of_scope(question):
+        return {"answer": FALLBACK_MESSAGE, "sources": [], "confidence": 0.0, "is_fallback": True, "mode": "fallback"}
+
+    # Pricing ranges (service-specific or clarify)
+    pr = answer_pricing_ranges(question, st)
+    if pr is not None:
+        return pr
+
+    # Core FAQ routing (stable, question-focused answers); KB facts (SLA per severity,
+    # support hours, payment split) only where they go beyond the matched FAQ's answer
+    matched = match_core_faq(question, st)
+    fact = answer_facts(question, st, covered=matched[0].get("reference_answer", "") if matched is not None else None)
+    if fact is not None:
+        return fact
+    if matched is not None:
+        core, score = matched
+        srcs = list(core.get("sources") or [])
+        return {
+            "answer": (core.get("reference_answer", "") or "").strip(),
+            "sources": srcs,
+            "confidence": _clamp01(score),
+            "is_fallback": False,
+            "mode": "grounded",
+        }
 
-    # 2) Keyword + typo-friendly routing for short queries
-    keyword_map = {
-        "service": "What services do you offer?",
-        "services": "What services do you offer?",
-        "discovery": "What is included in the Discovery session?",
-        "price": "What are your pricing models?",
-        "pricing": "What are your pricing models?",
-        "prcing": "What are your pricing models?",
-        "model": "What are your pricing models?",
-        "models": "What are your pricing models?",
-        "modls": "What are your pricing models?",
-        "payment": "What are the payment terms for a Fixed Price project?",
-        "payments": "What are the payment terms for a Fixed Price project?",
-        "process": "What is your engagement process from start to finish?",
-        "workflow": "What is your engagement process from start to finish?",
-        "nda": "Can we sign an NDA?",
-        "support": "What are your support hours?",
-        "supprt": "What are your support hours?",
-        "hours": "What are your support hours?",
-        "sla": "What is your SLA for a critical outage (Severity 1)?",
-        "policy": "What is your privacy policy?",
-        "policies": "What is your privacy policy?",
-        "refund": "What is your refund policy for Fixed Price work?",
-        "reschedule": "Can meetings be rescheduled?",
-        "rescheduling": "Can meetings be rescheduled?",
-    }
+    return None
 
-    if len(q.split()) <= 3:
-        if q in keyword_map:
-            target = keyword_map[q]
-            for _cn, it in core_norms:
-                if it.get("question") == target:
-                    it["_match_score"] = 0.9
-                    return it
-
-        keys = list(keyword_map.keys())
-        # Only apply typo-fuzzy matching for single-token queries (to avoid mapping vague phrases like 'support me').
-        if len(q.split()) == 1:
-            cm = difflib.get_close_matches(q, keys, n=1, cutoff=0.72)
-        else:
-            cm = []
-        if cm:
-            target = keyword_map[cm[0]]
-            for _cn, it in core_norms:
-                if it.get("question") == target:
-                    it["_match_score"] = 0.8
-                    return it
-
-        # heuristic: "prcing modls" style
-        if ("prc" in q or "pric" in q) and ("modl" in q or "model" in q):
-            target = "What are your pricing models?"
-            for _cn, it in core_norms:
-                if it.get("question") == target:
-                    it["_match_score"] = 0.8
-                    return it
-
-        # heuristic: "fixed price payment" -> payment terms (milestones)
-        if "fixed" in q and "price" in q and "payment" in q:
-            target = "What are the payment terms for a Fixed Price project?"
-            for _cn, it in core_norms:
-                if it.get("question") == target:
-                    it["_match_score"] = 0.82
-                    return it
-
-        if ("sup" in q and "hour" in q) or ("supprt" in q and "hour" in q) or ("hrs" in q):
-            target = "What are your support hours?"
-            for _cn, it in core_norms:
-                if it.get("question") == target:
-                    it["_match_score"] = 0.8
-                    return it
-
-    # 3) Rule-based intent routing for paraphrases
-    ql = q
-
-    def has_any(*terms: str) -> bool:
-        return any(t in ql for t in terms)
-
-    # Discovery paraphrases
-    if "discovery" in ql and has_any("include", "included", "deliver", "deliverable", "what do you", "session"):
-        target = "What is included in the Discovery session?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.85
-                return it
-
-    # Time & Materials billing paraphrases
-    if has_any("time & materials", "hourly", "weekly") and has_any("bill", "billing", "charge", "rate", "how do you"):
-        target = "How does Time & Materials billing work?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.85
-                return it
-
-    # Refunds / cancellation (higher priority than generic pricing)
-    if has_any("refund", "refunds", "cancel", "cancellation"):
-        target = "What is your refund policy for Fixed Price work?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.85
-                return it
-
-    # Payment terms (Fixed Price)
-    if (has_any("payment", "payments", "milestone", "milestones") or has_any("start", "start work", "begin", "kick off")) and has_any("fixed", "fixed price"):
-        target = "What are the payment terms for a Fixed Price project?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.83
-                return it
-
-    # Pricing models
-    if has_any("pricing", "price", "pricing model", "pricing models", "fixed price", "time & materials"):
-        target = "What are your pricing models?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.78
-                return it
-
-    # Privacy
-    if has_any("privacy", "client data", "data policy"):
-        target = "What is your privacy policy?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.85
-                return it
-
-    # Rescheduling
-    if has_any("reschedul", "reschedule", "move meeting", "change meeting"):
-        target = "Can meetings be rescheduled?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.85
-                return it
-
-    # Support hours
-    if has_any("support") and has_any("hour", "hours", "reach", "time", "business"):
-        target = "What are your support hours?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.85
-                return it
-
-    # SLA
-    if has_any("sla", "severity", "sev", "critical outage"):
-        target = "What is your SLA for a critical outage (Severity 1)?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.85
-                return it
-
-    # NDA
-    if "nda" in ql:
-        target = "Can we sign an NDA?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.85
-                return it
-
-    # After-Discovery questions: route to the most relevant core answer
-    if "after" in ql and "discovery" in ql:
-        if has_any("get", "deliver", "deliverable", "receive", "end", "result", "output"):
-            target = "What is included in the Discovery session?"
-        else:
-            target = "What is your engagement process from start to finish?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.84
-                return it
-
-    # Engagement workflow
-    if has_any("process", "workflow", "step-by-step", "steps", "start to finish", "engagement", "after the first call"):
-        target = "What is your engagement process from start to finish?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.85
-                return it
-
-    # Services overview
-    if has_any("services", "offer", "what do you do"):
-        target = "What services do you offer?"
-        for _cn, it in core_norms:
-            if it.get("question") == target:
-                it["_match_score"] = 0.75
-                return it
-
-    # 4) Final fuzzy match (typos / near-misses)
-    best = None
-    best_score = 0.0
-    for cn, it in core_norms:
-        if not cn:
-            continue
-        s = difflib.SequenceMatcher(a=qn, b=cn).ratio()
-        if s > best_score:
-            best_score = s
-            best = it
-    if best and best_score >= 0.70:
-        best["_match_score"] = _clamp01(best_score)
-        return best
 
-    return None
+def _json_bytes(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
 
 
+def _build_answer_table(st: "KBState"):
+    """Exact-hit routing table: normalized core question / alias text -> pre-encoded JSON.
 
+    Payloads come from `answer_static`, so a hit is byte-for-byte what the uncached path
+    would return, without running the fuzzy matchers or RAG.
+    """
+    table = {}
+    texts = [it.get("question", "") for it in st.items] + [a.get("alias", "") for a in st.aliases]
+    for text in texts:
+        key = _norm_q(text)
+        if not key or key in table:
+            continue
+        payload = answer_static(text, st)
+        if payload is None:
+            continue
+        table[key] = _json_bytes(payload)
+    return MappingProxyType(table)
+
+
+def answer_table(st: Optional["KBState"] = None):
+    # Payloads depend on the fact table, so the table is rebuilt when a reindex replaces it.
+    # Built on first use (it runs the core router, which needs the embedding model).
+    st = st or kb_state()
+    gen = facts_generation(st.kb.facts_path)
+    if st.answers[0] != gen:
+        st.answers = (gen, _build_answer_table(st))
+    return st.answers[1]
+
+
+class KBState:
+    """Per-KB answering state: core FAQ items and aliases, the semantic router and exact-hit
+    table built from them, typeahead, and the RAG semantic cache (tagged with the KB
+    generation). The default KB also gets the keyword rules written for its 12 core FAQs."""
+
+    def __init__(self, kb: KB, items, aliases, version: str):
+        self.kb = kb
+        self.items = items
+        self.aliases = aliases
+        self.by_id = MappingProxyType({int(it.get("id", 0)): it for it in items})
+        self.version = version
+        self.builtin_rules = kb is DEFAULT_KB
+        self.router: Optional[SemanticRouter] = None
+        self.answers = (object(), None)  # (facts generation, exact-hit table)
+        self._facts = current_facts(kb.facts_path)  # (facts generation, fact table)
+        # Typeahead over core questions + aliases (suggestions are always canonical questions)
+        self.suggest = SuggestIndex.from_faq(items, aliases)
+        # Reuses RAG-path answers for paraphrased questions
+        self.cache = SemanticCache(capacity=SEMANTIC_CACHE_SIZE, threshold=SEMANTIC_CACHE_THRESHOLD)
+
+    def facts(self) -> FactTable:
+        """Fact table of the current index build; reloaded when a reindex replaces it."""
+        self._facts = current_facts(self.kb.facts_path, self._facts)
+        return self._facts[1]
+
+    def nbytes(self) -> int:
+        """Rough resident size: router vectors, fact table, encoded exact-hit answers, cached responses."""
+        n = self.router.vecs.nbytes if self.router is not None else 0
+        n += self._facts[1].nbytes()
+        table = self.answers[1]
+        n += sum(len(k) + len(v) for k, v in table.items()) if table else 0
+        return n + self.cache.nbytes()
+
+
+def kb_state(kb: KB = DEFAULT_KB) -> KBState:
+    """Answering state of `kb`, loaded on first use (index included) and kept in the shared
+    `RESIDENT` LRU with the indexes; the embedding model is the same for every KB."""
+    def load() -> KBState:
+        if kb is DEFAULT_KB:
+            return KBState(kb, FAQ_ITEMS, ALIASES, _FAQ_VERSION)
+        load_kb(kb)  # build / verify its index before answering from its fact table
+        return KBState(kb, *_load_faq(kb))
+
+    with kb_lock(("faq", kb.name)):
+        return RESIDENT.get(("faq", kb.name), load, KBState.nbytes)
+
+
+SINGLE_FLIGHT = SingleFlight()
+PROFILER = RequestProfiler(PROFILE_DIR, PROFILE_SLOW_MS, PROFILE_EVERY_N, PROFILE_INTERVAL_MS, PROFILE_KEEP)
+# Fingerprinted, precompressed JS/CSS and the rendered HTML shell (restart to pick up UI edits)
+ASSETS = AssetTable(Path("static"), Path("templates/index.html"))
+# One watcher per KB in KB_WATCH, started with the app
+WATCHERS: List[KBWatcher] = []
+
+
+def load_index():
+    # Verify (or install from INDEX_BUNDLE) and load the index before serving; a mismatched
+    # or corrupt index stops the server here instead of failing on the first question.
+    # Then embed the core FAQ router table and build the exact-hit table, and start watching
+    # the KB_WATCH folders: requests pick up the re-published index by its generation.
+    prepare_index()
+    core_router()
+    answer_table()
+    for name in KB_WATCH:
+        kb = get_kb(name)
+        WATCHERS.append(KBWatcher(
+            kb.kb_dir, lambda names, kb=kb: update_index(names, kb),
+            debounce_s=KB_WATCH_DEBOUNCE_S, max_delay_s=KB_WATCH_MAX_DELAY_S, tick_s=KB_WATCH_POLL_S,
+            poll_batch=KB_WATCH_POLL_BATCH, backend=KB_WATCH_BACKEND, name=f"kb-watcher-{kb.name}",
+        ).start())
+
+def stop_watchers():
+    for w in WATCHERS:
+        w.stop()
+    WATCHERS.clear()
+
+
+@asynccontextmanager
+async def lifespan(_app: FastAPI):
+    load_index()
+    try:
+        yield
+    finally:
+        stop_watchers()
 
 
-app = FastAPI(title="FAQ Chatbot (RAG)")
+app = FastAPI(title="FAQ Chatbot (RAG)", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
 
 class ChatIn(BaseModel):
     question: str
+    # Knowledge base to answer from (see GET /kbs); None = the default KB
+    kb: Optional[str] = None
+    # Optional metadata filters for the retrieval tier (KB file names / top-level categories)
+    sources: Optional[List[str]] = None
+    categories: Optional[List[str]] = None
 
 
-@app.get("/", response_class=HTMLResponse)
-def home():
-    with open("templates/index.html", "r", encoding="utf-8") as f:
-        return HTMLResponse(f.read())
+class BatchIn(BaseModel):
+    questions: List[str]
+    # Generation the client's cached answers belong to; if still current, nothing is recomputed
+    generation: Optional[str] = None
+    kb: Optional[str] = None
 
 
-@app.post("/chat")
-def chat(payload: ChatIn):
+def answers_generation(st: Optional[KBState] = None) -> str:
+    """Identifies the answers the server currently gives for a KB (index version + FAQ
+    files). Clients key cached answers by it."""
+    st = st or kb_state()
+    return f"{kb_version(st.kb)}.{st.version}"
+
+
+@app.get("/", response_class=HTMLResponse)
+def home(request: Request):
+    return asset_response(ASSETS.shell, request.headers, REVALIDATE)
+
+
+@app.get("/assets/{name}")
+def asset(name: str, request: Request):
+    found = ASSETS.get(name)
+    if found is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return asset_response(found, request.headers, IMMUTABLE)
+
+
+def answer_rag(
+    question: str, sources: Optional[List[str]] = None, categories: Optional[List[str]] = None, st: Optional[KBState] = None,
+) -> bytes:
+    """Retrieval tier: semantic cache, vector search, then LLM or extractive answer.
+    Returns the encoded JSON response; `tier` records which answerer produced it."""
+    deadline = time.monotonic() + LLM_DEADLINE_S
+    st = st or kb_state()
+
+    # Semantic cache: paraphrases of an already answered RAG question
+    filtered = bool(sources or categories)
+    q_emb = embed_query(_norm_q(question))
+    if not filtered:
+        cached = st.cache.lookup(q_emb, kb_generation(st.kb))
+        if cached is not None:
+            return cached
+
+    # Retrieval + (optional) LLM / extractive answering.
+    # Explicit filters are strict; a detected intent only narrows the first search.
+    hint = sources or (detect_sources(question) if INTENT_FILTER else None)
+    chunks, best_score = retrieve(_norm_q(question), q_emb=q_emb, sources=hint, categories=categories, strict=filtered, kb=st.kb)
+    chunks = rerank_chunks(question, chunks)
+    confidence = float(best_score)
+
+    if should_fallback(question, chunks, best_score):
+        return _json_bytes({"answer": FALLBACK_MESSAGE, "sources": [], "confidence": confidence, "is_fallback": True, "mode": "fallback"})
+
+    context = format_context(chunks, question=question)
+
+    # LLM under a deadline; with hedging, the extractive answer is built while it runs.
+    fut, status = submit_answer(question, context)
+    extractive = answer_from_chunks(question, chunks) if (fut is not None and LLM_HEDGE) else None
+    answer, tier = "", "extractive"
+    if fut is not None:
+        answer, status = wait_answer(fut, deadline - time.monotonic())
+        if answer:
+            tier = "llm"
+
+    used_sources = []
+    if not answer:
+        answer, used_sources = extractive or answer_from_chunks(question, chunks)
+
+    # Prefer sources actually used by extractive answer; otherwise use retrieved sources.
+    out_sources = sorted({s for c in chunks for s in chunk_sources(c)})
+    if used_sources:
+        out_sources = used_sources
+
+    result = {"answer": (answer or "").strip(), "sources": out_sources, "confidence": confidence, "is_fallback": False, "mode": "grounded", "tier": tier}
+    body = _json_bytes(result)
+    # Do not cache degraded answers (LLM configured but timed out / refused).
+    if not filtered and (tier == "llm" or status == "disabled"):
+        st.cache.store(q_emb, body, kb_generation(st.kb))
+    return body
+
+
+def _route(payload: ChatIn, kb: KB = DEFAULT_KB) -> Tuple[Response, str]:
+    """Answer `payload` from `kb`; also returns which route produced the answer (for profiles)."""
     try:
+        st = kb_state(kb)
         question = payload.question.strip()
         if not question:
             return JSONResponse(
                 {"answer": "Please type a question to get started.", "sources": [], "confidence": 0.0, "is_fallback": True, "mode": "fallback"}
-            )
-
-        q_lower = question.lower().strip()
-
-        # Special-case: '24/7' queries should be explicit and not dump unrelated SLA details.
-        if any(x in q_lower for x in ["24/7", "24x7"]):
-            return JSONResponse({
-                "answer": "The knowledge base lists business hours (Mon–Fri, 09:00–17:00 CET/CEST) and does not mention 24/7 support.",
-                "sources": ["support.md"],
-                "confidence": 0.5,
-                "is_fallback": False,
-                "mode": "grounded",
-            })
-
-        # Hard out-of-scope guard: do not answer from retrieval.
-        if is_out_of_scope(question):
-            return JSONResponse({"answer": FALLBACK_MESSAGE, "sources": [], "confidence": 0.0, "is_fallback": True, "mode": "fallback"})
-
-        # Pricing ranges (service-specific or clarify)
-        pr = answer_pricing_ranges(question)
-        if pr is not None:
-            return JSONResponse(pr)
-
-        # Core FAQ routing (stable, question-focused answers)
-        core = match_core_faq(question)
-        if core is not None:
-            srcs = core.get("sources") or []
-            return JSONResponse({
-                "answer": (core.get("reference_answer", "") or "").strip(),
-                "sources": srcs,
-                "confidence": _clamp01(core.get("_match_score", 0.9)),
-                "is_fallback": False,
-                "mode": "grounded",
-            })
-
-        # Retrieval + (optional) LLM / extractive answering
-        chunks, best_score = retrieve(_norm_q(question))
-        chunks = rerank_chunks(question, chunks)
-        confidence = float(best_score)
-
-        if should_fallback(question, chunks, best_score):
-            return JSONResponse({"answer": FALLBACK_MESSAGE, "sources": [], "confidence": confidence, "is_fallback": True, "mode": "fallback"})
-
-        context = format_context(chunks)
-
-        answer = generate_answer(question=question, context=context)
-
-        used_sources = []
-        if not answer:
-            answer, used_sources = answer_from_chunks(question, chunks)
-
-        # Prefer sources actually used by extractive answer; otherwise use retrieved sources.
-        sources = sorted({c.get("source", "") for c in chunks if c.get("source")})
-        if used_sources:
-            sources = used_sources
-
-        return JSONResponse({"answer": (answer or "").strip(), "sources": sources, "confidence": confidence, "is_fallback": False, "mode": "grounded"})
+            ), "empty"
+
+        hit = answer_table(st).get(_norm_q(question))
+        if hit is not None:
+            return Response(content=hit, media_type="application/json"), "answer_table"
+
+        static = answer_static(question, st)
+        if static is not None:
+            return JSONResponse(static), "static"
+
+        # Concurrent identical questions share one embed / search / LLM computation.
+        key = (kb.name, _norm_q(question), tuple(payload.sources or ()), tuple(payload.categories or ()))
+        body = SINGLE_FLIGHT.do(key, lambda: answer_rag(question, payload.sources, payload.categories, st))
+        return Response(content=body, media_type="application/json"), "rag"
 
     except Exception:
         # Fail-safe: never crash the server for a bad request path.
-        return JSONResponse({"answer": "Server error. Please try again.", "sources": [], "confidence": 0.0, "is_fallback": True, "mode": "error"})
+        return JSONResponse({"answer": "Server error. Please try again.", "sources": [], "confidence": 0.0, "is_fallback": True, "mode": "error"}), "error"
+
+
+def _kb_or_404(name: Optional[str]) -> KB:
+    try:
+        return get_kb(name)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Unknown knowledge base {name!r}")
+
+
+@app.post("/chat")
+def chat(payload: ChatIn):
+    kb = _kb_or_404(payload.kb)
+    sample = PROFILER.begin()  # None unless profiling is enabled
+    resp, route = _route(payload, kb)
+    if sample is not None:
+        try:
+            PROFILER.end(sample, payload.question, route, resp.body)
+        except Exception:
+            pass  # profiling must never fail the request it observed
+    try:
+        resp.headers["X-KB-Generation"] = answers_generation(kb_state(kb))
+    except Exception:
+        pass  # no index: the answer itself already reports the error
+    return resp
+
+
+@app.post("/kb/{name}/chat")
+def chat_kb(name: str, payload: ChatIn):
+    """`/chat` against KB `name` (per-route selection, e.g. one path prefix per tenant)."""
+    payload.kb = name
+    return chat(payload)
+
+
+def _answer_deterministic(question: str, st: Optional[KBState] = None) -> Optional[bytes]:
+    """Encoded answer from the answer table / static tiers, or None if it needs retrieval."""
+    q = question.strip()
+    if not q:
+        return None
+    hit = answer_table(st).get(_norm_q(q))
+    if hit is not None:
+        return hit
+    static = answer_static(q, st)
+    return _json_bytes(static) if static is not None else None
+
+
+@app.post("/chat/batch")
+def chat_batch(payload: BatchIn):
+    """Answers for up to `CHAT_BATCH_MAX` known questions (UI prefetch) in one round trip.
+
+    Only the deterministic tiers run here; questions that would need retrieval / the LLM get
+    null and are answered by `/chat` when asked. If `generation` is still current, returns
+    `{"generation": ..., "unchanged": true}` without answering anything.
+    """
+    st = kb_state(_kb_or_404(payload.kb))
+    gen = answers_generation(st)
+    if payload.generation == gen:
+        return {"generation": gen, "unchanged": True}
+    bodies = [_answer_deterministic(q, st) or b"null" for q in payload.questions[:CHAT_BATCH_MAX]]
+    body = b'{"generation":' + _json_bytes(gen) + b',"answers":[' + b",".join(bodies) + b"]}"
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/suggest")
+def suggest(q: str = "", limit: int = 5, kb: Optional[str] = None):
+    st = kb_state(_kb_or_404(kb))
+    return {"q": q, "suggestions": st.suggest.suggest(q[:200], max(0, min(limit, 10)))}
 
 
 @app.post("/reindex")
 
-def reindex():
-    stats = build_index()
+def reindex(kb: Optional[str] = None):
+    stats = build_index(kb=_kb_or_404(kb))
     return JSONResponse({"ok": True, "stats": stats})
 
 
+@app.get("/kbs")
+def kbs():
+    """Servable knowledge bases and what is currently loaded under `KB_MEMORY_BUDGET_MB`."""
+    return {"kbs": available_kbs(), "resident": RESIDENT.stats()}
+
+
 @app.get("/health")
 def health():
-    return {"ok": True}
+    return {"ok": True, "index": index_info()}
+
+
+@app.get("/stats")
+def stats():
+    return {
+        "semantic_cache": kb_state().cache.stats(),
+        "single_flight": SINGLE_FLIGHT.stats(),
+        "llm": LLM_GATE.stats(),
+        "shards": shards.stats(),
+        "profiler": PROFILER.stats(),
+        "kbs": RESIDENT.stats(),
+        "assets": ASSETS.stats(),
+        "watchers": [w.stats() for w in WATCHERS],
+    }
+
+
+@app.get("/profiles")
+def profiles():
+    return {"profiles": PROFILER.list()}
+
+
+@app.get("/profiles/{name}")
+def profile(name: str):
+    path = PROFILER.path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="text/plain; charset=utf-8", filename=path.name)
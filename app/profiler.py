@@ -0,0 +1,177 @@
+from __future__ import annotations
+from collections import Counter
+from pathlib import Path
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from typing import Dict, List, Optional
+
+_NAME_RE = re.compile(r"^[\w.-]+\.folded$")
+
+
+class _Sample:
+    __slots__ = ("thread_id", "start", "stacks", "selected")
+
+    def __init__(self, thread_id: int, selected: bool):
+        self.thread_id = thread_id
+        self.start = time.perf_counter()
+        self.stacks: Counter = Counter()
+        self.selected = selected
+
+
+def _collapse(frame) -> str:
+    """One stack in collapsed ("folded") form, root first: `file:func;file:func`."""
+    names = []
+    while frame is not None:
+        co = frame.f_code
+        names.append(f"{os.path.basename(co.co_filename)}:{co.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class RequestProfiler:
+    """Sampling profiler for individual requests.
+
+    While a request is being profiled, one shared background thread records the request
+    thread's stack every `interval_ms`. With `slow_ms` > 0 every request is sampled and the
+    profile is kept only if the request took at least `slow_ms`; with `every_n` > 0 one request
+    in N is sampled and always kept. Kept profiles are written to `out_dir` as collapsed stacks
+    (`<id>.folded`, the input format of flamegraph.pl / speedscope) plus a `<id>.json` with the
+    question, route/tier and latency; only the newest `keep` are retained. With both
+    thresholds at 0 the profiler is off and `begin()` returns None without doing anything.
+    """
+
+    def __init__(self, out_dir: Path, slow_ms: float = 0.0, every_n: int = 0, interval_ms: float = 5.0, keep: int = 50):
+        self.out_dir = out_dir
+        self.slow_ms = slow_ms
+        self.every_n = every_n
+        self.interval = max(interval_ms, 0.5) / 1000.0
+        self.keep = keep
+        self.enabled = slow_ms > 0 or every_n > 0
+        self._seq = itertools.count(1)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._active: Dict[int, _Sample] = {}
+        self._thread: threading.Thread | None = None
+        self._counts = {"sampled": 0, "written": 0}
+
+    def begin(self) -> Optional[_Sample]:
+        if not self.enabled:
+            return None
+        selected = self.every_n > 0 and next(self._seq) % self.every_n == 0
+        if not selected and self.slow_ms <= 0:
+            return None
+        sample = _Sample(threading.get_ident(), selected)
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+            self._active[id(sample)] = sample
+            self._counts["sampled"] += 1
+            self._wake.notify()
+        return sample
+
+    def end(self, sample: Optional[_Sample], question: str, route: str, body: bytes | None = None) -> Optional[str]:
+        """Stop sampling; write the profile if it qualifies. Returns its id, if written."""
+        if sample is None:
+            return None
+        elapsed_ms = (time.perf_counter() - sample.start) * 1000.0
+        with self._lock:
+            self._active.pop(id(sample), None)
+            # The sampler may still be recording a stack it collected before the pop
+            stacks = Counter(sample.stacks)
+        # 1-in-N profiles are kept even when the request finished before the first sample,
+        # so the listing still shows their latency and route.
+        if not (sample.selected or (elapsed_ms >= self.slow_ms and stacks)):
+            return None
+        return self._write(sample, stacks, elapsed_ms, question, route, body)
+
+    def _run(self) -> None:
+        me = threading.get_ident()
+        while True:
+            with self._lock:
+                while not self._active:
+                    self._wake.wait()
+                targets = list(self._active.values())
+            frames = sys._current_frames()
+            collected = [(s, _collapse(frames[s.thread_id])) for s in targets if s.thread_id in frames and s.thread_id != me]
+            del frames
+            with self._lock:
+                for s, stack in collected:
+                    s.stacks[stack] += 1
+            time.sleep(self.interval)
+
+    def _write(self, sample: _Sample, stacks: Counter, elapsed_ms: float, question: str, route: str, body: bytes | None) -> str:
+        tier = None
+        if body:
+            try:
+                data = json.loads(body)
+                tier = data.get("tier") or data.get("mode")
+            except ValueError:
+                pass
+        route_tag = re.sub(r"[^\w-]", "", route)
+        pid = f"{time.strftime('%Y%m%d-%H%M%S')}-{int(elapsed_ms)}ms-{route_tag}-{next(self._ids)}"
+        info = {
+            "id": pid,
+            "question": question,
+            "route": route,
+            "tier": tier,
+            "latency_ms": round(elapsed_ms, 2),
+            "samples": sum(stacks.values()),
+            "interval_ms": self.interval * 1000.0,
+            "reason": "every_n" if sample.selected else "slow",
+            "time": time.time(),
+        }
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        with (self.out_dir / f"{pid}.folded").open("w", encoding="utf-8") as f:
+            for stack, n in stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        (self.out_dir / f"{pid}.json").write_text(json.dumps(info, ensure_ascii=False), encoding="utf-8")
+        with self._lock:
+            self._counts["written"] += 1
+        self._prune()
+        return pid
+
+    def _prune(self) -> None:
+        for old in self._profiles()[self.keep:]:
+            for suffix in (".folded", ".json"):
+                (self.out_dir / (old.stem + suffix)).unlink(missing_ok=True)
+
+    def _profiles(self) -> List[Path]:
+        if not self.out_dir.exists():
+            return []
+        found = []
+        for p in self.out_dir.glob("*.json"):
+            try:
+                found.append((p.stat().st_mtime_ns, p))
+            except FileNotFoundError:
+                continue  # pruned by another request since the glob
+        return [p for _, p in sorted(found, reverse=True)]
+
+    def list(self) -> List[Dict]:
+        """Metadata of the retained profiles, newest first."""
+        out = []
+        for p in self._profiles():
+            try:
+                out.append(json.loads(p.read_text(encoding="utf-8")))
+            except (OSError, ValueError):
+                continue
+        return out
+
+    def path(self, name: str) -> Optional[Path]:
+        """Collapsed-stack file for profile `name` (with or without `.folded`), if it exists."""
+        if not name.endswith(".folded"):
+            name += ".folded"
+        if not _NAME_RE.match(name):
+            return None
+        p = self.out_dir / name
+        return p if p.exists() else None
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return dict(self._counts, enabled=self.enabled, slow_ms=self.slow_ms, every_n=self.every_n, active=len(self._active))
@@ -0,0 +1,78 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+import os
+
+import numpy as np
+
+
+@dataclass(frozen=True)
+class Projection:
+    """Linear map from embedding space to `dim` principal axes of a KB's chunk vectors
+    (optionally whitened), fitted at index time and applied to chunks and queries alike.
+    Outputs are re-normalized, so inner products stay cosine similarities."""
+    mean: np.ndarray    # (in_dim,)
+    matrix: np.ndarray  # (in_dim, dim); columns scaled by 1/sqrt(variance) when whitened
+    whiten: bool
+    explained: float    # share of the chunk vectors' variance kept
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1])
+
+    @property
+    def in_dim(self) -> int:
+        return int(self.matrix.shape[0])
+
+    def apply(self, x: np.ndarray) -> np.ndarray:
+        y = (np.asarray(x, dtype="float32") - self.mean) @ self.matrix
+        y /= np.linalg.norm(y, axis=-1, keepdims=True) + 1e-9
+        return y
+
+    def apply_rows(self, x: np.ndarray, block: int = 65536) -> np.ndarray:
+        """`apply()` over a (possibly memory-mapped) matrix, a block of rows at a time."""
+        out = np.empty((len(x), self.dim), dtype="float32")
+        for i in range(0, len(x), block):
+            out[i:i + block] = self.apply(x[i:i + block])
+        return out
+
+    def save(self, path: Path) -> None:
+        tmp = path.with_suffix(".tmp.npz")
+        with tmp.open("wb") as out:
+            np.savez(out, mean=self.mean, matrix=self.matrix, whiten=self.whiten, explained=self.explained)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "Projection":
+        with np.load(str(path)) as z:
+            return cls(z["mean"].astype("float32"), z["matrix"].astype("float32"), bool(z["whiten"]), float(z["explained"]))
+
+
+def fit_projection(vecs: np.ndarray, dim: int, whiten: bool = False, block: int = 65536) -> Projection | None:
+    """PCA of `vecs` (rows) down to `dim` axes, or None if that would not reduce the width.
+
+    The covariance is accumulated a block of rows at a time, so memory is O(in_dim^2)
+    whatever the number of chunks. A KB with fewer chunks than `dim` has fewer non-trivial
+    axes; only those are kept.
+    """
+    n, d = vecs.shape
+    mean = np.zeros(d, dtype="float64")
+    for i in range(0, n, block):
+        mean += np.asarray(vecs[i:i + block], dtype="float64").sum(axis=0)
+    mean /= max(1, n)
+    cov = np.zeros((d, d), dtype="float64")
+    for i in range(0, n, block):
+        x = np.asarray(vecs[i:i + block], dtype="float64") - mean
+        cov += x.T @ x
+    cov /= max(1, n - 1)
+    var, axes = np.linalg.eigh(cov)  # ascending
+    var, axes = var[::-1].clip(min=0.0), axes[:, ::-1]
+    total = float(var.sum())
+    rank = int((var > 1e-9 * var[0]).sum()) if total > 0 else 0
+    k = min(dim, rank)
+    if k <= 0 or k >= d:
+        return None
+    matrix = axes[:, :k]
+    if whiten:
+        matrix = matrix / np.sqrt(var[:k])
+    return Projection(mean.astype("float32"), matrix.astype("float32"), whiten, float(var[:k].sum() / total))
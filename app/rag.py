@@ -1,9 +1,14 @@
 from __future__ import annotations
-from dataclasses import dataclass
+from dataclasses import asdict, dataclass
+from functools import lru_cache
 from pathlib import Path
 import json
+import os
 import re
-from typing import List, Dict, Tuple
+import shutil
+import time
+import zlib
+from typing import Callable, Iterable, List, Dict, Sequence, Tuple
 
 import numpy as np
 try:
@@ -15,15 +20,23 @@ try:
 except Exception:  # pragma: no cover
     SentenceTransformer = None  # type: ignore
 
-from .config import KB_DIR, INDEX_PATH, META_PATH, TOP_K, SIMILARITY_THRESHOLD, EMBED_MODEL, LEXICAL_THRESHOLD
+from .config import TOP_K, SIMILARITY_THRESHOLD, EMBED_MODEL, LEXICAL_THRESHOLD
+from .config import DEDUP_THRESHOLD, MMR_LAMBDA, MMR_CANDIDATES
+from .config import COARSE_SECTIONS, INDEX_SHARDS, SHARD_ADDRS
+from .config import CONTEXT_TOKENS
+from .config import CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS, INDEX_AUTOBUILD, INDEX_BUNDLE
+from .config import INDEX_PCA_DIM, INDEX_PCA_WHITEN, INDEX_PCA_RESCORE
+from . import artifacts, shards
+from .artifacts import ArtifactError
+from .dedup import NearDuplicateFilter
+from .facts import extract_facts, merge_facts, write_facts
+from .ingest import Chunk, is_kb_name, iter_kb_files, run_ingest
+from .kbs import DEFAULT_KB, KB, RESIDENT, kb_lock
+from .projection import Projection, fit_projection
+from .tokens import count_tokens
 
 # If FAISS isn't available, we fall back to a NumPy-based index file.
-EMB_PATH = INDEX_PATH.with_suffix('.npy')
-
-@dataclass
-class Chunk:
-    text: str
-    source: str
+EMB_PATH = DEFAULT_KB.emb_path
 
 _MODEL: SentenceTransformer | None = None
 
@@ -41,7 +54,7 @@ class _HashEmbedder:
         for t in texts:
             v = np.zeros((self.dim,), dtype="float32")
             for tok in re.findall(r"[a-z0-9]+", (t or "").lower()):
-                h = (hash(tok) % self.dim)
+                h = zlib.crc32(tok.encode("utf-8")) % self.dim  # stable across processes, unlike hash()
                 v[h] += 1.0
             if normalize_embeddings:
                 n = float(np.linalg.norm(v) + 1e-9)
@@ -58,87 +71,465 @@ def _get_model():
             _MODEL = _HashEmbedder(dim=512)
     return _MODEL
 
-def _read_kb_files(kb_dir: Path) -> List[Tuple[str, str]]:
-    files = sorted([p for p in kb_dir.glob("*.md") if p.is_file()])
-    docs = []
-    for p in files:
-        # Do NOT index the boundary/scope file (it can pollute retrieval)
-        if p.name.lower().startswith("00_"):
-            continue
-        docs.append((p.name, p.read_text(encoding="utf-8")))
-    return docs
-
-def _clean(text: str) -> str:
-    text = re.sub(r"\r\n?", "\n", text)
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    return text.strip()
-
-def _chunk_text(text: str, max_chars: int = 800, overlap: int = 140) -> List[str]:
-    parts = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
-    chunks: List[str] = []
-    buf = ""
-    for p in parts:
-        if not buf:
-            buf = p
-        elif len(buf) + 2 + len(p) <= max_chars:
-            buf += "\n\n" + p
-        else:
-            chunks.append(buf)
-            tail = buf[-overlap:] if overlap > 0 else ""
-            buf = (tail + "\n\n" + p).strip()
-    if buf:
-        chunks.append(buf)
-    return chunks
-
-def build_index() -> Dict[str, int]:
-    docs = _read_kb_files(KB_DIR)
+def embedder_info() -> Dict:
+    """Identity of the query/chunk embedder; index artifacts are only valid for the same one."""
     model = _get_model()
+    if isinstance(model, _HashEmbedder):
+        return {"backend": "hash-crc32", "model": None, "dim": model.dim, "normalized": True}
+    return {"backend": "sentence-transformers", "model": EMBED_MODEL, "dim": int(model.get_sentence_embedding_dimension()), "normalized": True}
+
+def _index_format() -> str:
+    return "faiss" if faiss is not None else "npy"
 
-    all_chunks: List[Chunk] = []
-    for fname, content in docs:
-        content = _clean(content)
-        for c in _chunk_text(content):
-            all_chunks.append(Chunk(text=c, source=fname))
+def _index_file(kb: KB = DEFAULT_KB) -> Path:
+    return kb.index_path if faiss is not None else kb.emb_path
 
-    texts = [c.text for c in all_chunks]
-    emb = model.encode(texts, normalize_embeddings=True, batch_size=32, show_progress_bar=False)
-    emb = np.asarray(emb, dtype="float32")
+def _artifact_name(path: Path, kb: KB = DEFAULT_KB) -> str:
+    return path.relative_to(kb.cache_dir).as_posix()
 
-    META_PATH.parent.mkdir(parents=True, exist_ok=True)
+def _embed_text(chunk: Chunk) -> str:
+    # Prefix the heading path so continuation chunks keep their section context.
+    if chunk.headings:
+        return " > ".join(chunk.headings) + "\n" + chunk.text
+    return chunk.text
 
+def _encode_chunks(model, batch: List[Chunk]) -> np.ndarray:
+    emb = model.encode([_embed_text(c) for c in batch], normalize_embeddings=True, batch_size=32, show_progress_bar=False)
+    return np.asarray(emb, dtype="float32")
+
+def build_index(progress: Callable[[Dict[str, float]], None] | None = None, kb: KB = DEFAULT_KB) -> Dict[str, float]:
+    """Run the ingestion pipeline over `kb.kb_dir` and write the index to `kb.cache_dir`.
+
+    Vectors and chunk metadata are appended batch by batch as the pipeline produces them;
+    the finished files are swapped in atomically at the end. Near-duplicate chunks are
+    dropped before embedding and their sources are merged into the chunk that was kept.
+    A manifest (embedder, KB content hash, checksums) is written next to the artifacts.
+    Only the default KB is split into shards (`INDEX_SHARDS`).
+    """
+    with kb_lock(("build", kb.name)):
+        return _build_full(progress, kb)
+
+def _build_full(progress: Callable[[Dict[str, float]], None] | None, kb: KB) -> Dict[str, float]:
+    model = _get_model()
+    kb_files = list(iter_kb_files(kb.kb_dir))
+    dim = 0
+
+    dedup = NearDuplicateFilter(DEDUP_THRESHOLD) if DEDUP_THRESHOLD <= 1.0 else None
+    merged: Dict[int, List[str]] = {}
+
+    def keep(c: Chunk) -> bool:
+        if dedup is None:
+            return True
+        dup = dedup.add(c.text)
+        if dup is None:
+            return True
+        srcs = merged.setdefault(dup, [])
+        if c.source not in srcs:
+            srcs.append(c.source)
+        return False
+
+    kb.cache_dir.mkdir(parents=True, exist_ok=True)
+    meta_tmp = kb.meta_path.with_suffix(".tmp")
+    raw_tmp = kb.emb_path.with_suffix(".tmp.f32")
+
+    index = None
+    n_written = 0
+    section_sums: Dict[str, np.ndarray] = {}
+    with meta_tmp.open("w", encoding="utf-8") as f, raw_tmp.open("wb") as vf:
+        def encode(batch: List[Chunk]) -> np.ndarray:
+            return _encode_chunks(model, batch)
+
+        def sink(batch: List[Chunk], emb: np.ndarray) -> None:
+            nonlocal index, dim, n_written
+            dim = int(emb.shape[1])
+            if faiss is not None:
+                if index is None:
+                    index = faiss.IndexFlatIP(dim)
+                index.add(emb)
+            else:
+                vf.write(np.ascontiguousarray(emb).tobytes())
+            for c, vec in zip(batch, emb):
+                key = _section_key(c.source, c.headings)
+                if key in section_sums:
+                    section_sums[key] += vec
+                else:
+                    section_sums[key] = vec.copy()
+                f.write(",\n" if n_written else "[\n")
+                json.dump(dict(asdict(c), sources=[c.source]), f, ensure_ascii=False)
+                n_written += 1
+
+        stats = run_ingest(kb_files, encode, sink, progress=progress, keep=keep)
+        f.write("\n]\n" if n_written else "[]\n")
+
+    if not n_written:
+        meta_tmp.unlink()
+        raw_tmp.unlink()
+        raise RuntimeError(f"No knowledge base chunks found in {kb.kb_dir}")
+    if merged:
+        _merge_sources(meta_tmp, merged)
+
+    index_tmp = _staged_index(kb, "build")
     if faiss is not None:
-        index = faiss.IndexFlatIP(emb.shape[1])
-        index.add(emb)
-        faiss.write_index(index, str(INDEX_PATH))
+        raw_tmp.unlink()
+        faiss.write_index(index, str(index_tmp))
     else:
-        # NumPy fallback: store normalized embeddings in a .npy file
-        np.save(str(EMB_PATH), emb)
+        # NumPy fallback: wrap the streamed raw vectors in a .npy header
+        with index_tmp.open("wb") as out, raw_tmp.open("rb") as src:
+            np.lib.format.write_array_header_1_0(out, {"descr": "<f4", "fortran_order": False, "shape": (n_written, dim)})
+            shutil.copyfileobj(src, out)
+        raw_tmp.unlink()
+
+    def vectors() -> np.ndarray:
+        if faiss is not None:
+            return index.reconstruct_n(0, index.ntotal)
+        return np.load(str(index_tmp), mmap_mode="r")
+
+    stats["dim"] = dim
+    # Structured facts (prices, SLA levels, hours, payment split) for retrieval-free answers
+    facts = extract_facts(kb_files)
+    return _publish(kb, index_tmp, meta_tmp, section_sums, vectors, facts, artifacts.source_digests(kb_files, kb.kb_dir), stats)
+
+def _publish(
+    kb: KB, index_tmp: Path, meta_tmp: Path, section_sums: Dict[str, np.ndarray], vectors: Callable[[], np.ndarray],
+    facts: Dict, digests: Dict[str, str], stats: Dict,
+) -> Dict:
+    """Shared tail of full and incremental builds, given the staged index and metadata files:
+    stages the optional projection, section centroids, shards and facts next to them,
+    checksums the staged files into the manifest, then renames everything into place. The
+    manifest and the metadata file go last; the metadata mtime is the generation readers
+    reload on, so a reader never pairs the new metadata with old artifacts."""
+    staged = {_index_file(kb): index_tmp, kb.meta_path: meta_tmp}
+    proj = _write_projection(kb, vectors, stats, staged)
+    if proj is not None:
+        vectors = lambda: _read_vectors(kb, staged[_index_file(kb)])  # shards hold the reduced vectors
+    # Coarse level: one normalized centroid per (file, section)
+    labels = sorted(section_sums)
+    cents = np.stack([section_sums[k] for k in labels]).astype("float32")
+    cents /= np.linalg.norm(cents, axis=1, keepdims=True) + 1e-9
+    if proj is not None:
+        cents = proj.apply(cents)
+    staged[kb.centroids_path] = kb.centroids_path.with_suffix(".tmp.npz")
+    with staged[kb.centroids_path].open("wb") as out:
+        np.savez(out, vectors=cents, labels=np.array(labels))
+    stats["sections"] = len(labels)
+
+    if INDEX_SHARDS > 1 and kb is DEFAULT_KB:
+        staged.update(shards.stage_shards(vectors(), INDEX_SHARDS))
+        stats["shards"] = INDEX_SHARDS
+
+    staged[kb.facts_path] = kb.facts_path.with_suffix(".tmp.json")
+    write_facts(facts, staged[kb.facts_path])
+    stats["facts"] = len(facts["prices"]) + len(facts["severities"]) + bool(facts["support_hours"]) + bool(facts["payment_split"])
+
+    files = {_artifact_name(p, kb): tmp for p, tmp in staged.items()}
+    manifest = artifacts.make_manifest(
+        files, embedder_info(), _index_format(), artifacts.digests_hash(digests), stats,
+        params={
+            "chunk_tokens": CHUNK_TOKENS, "chunk_overlap_tokens": CHUNK_OVERLAP_TOKENS, "dedup_threshold": DEDUP_THRESHOLD,
+            "pca_dim": INDEX_PCA_DIM, "pca_whiten": INDEX_PCA_WHITEN,
+        },
+        sources=digests,
+    )
+    artifacts.publish(files, manifest, last=_artifact_name(kb.meta_path, kb), cache_dir=kb.cache_dir)
+    if proj is None:
+        for p in (kb.projection_path, kb.full_path):
+            p.unlink(missing_ok=True)  # a previous build's; no longer in the manifest
+
+    stats["version"] = manifest["version"]
+    return stats
+
+def _write_projection(kb: KB, vectors: Callable[[], np.ndarray], stats: Dict, staged: Dict[Path, Path]) -> Projection | None:
+    """With `INDEX_PCA_DIM`, fit the projection on the staged full-width vectors, stage those
+    as `kb.full_path` (for rescoring) and restage the index file at the reduced width."""
+    if INDEX_PCA_DIM <= 0:
+        return None
+    full = vectors()  # one copy: with FAISS each call reconstructs every vector
+    proj = fit_projection(full, INDEX_PCA_DIM, INDEX_PCA_WHITEN)
+    if proj is None:
+        return None
+    staged[kb.full_path] = kb.full_path.with_suffix(".tmp.npy")
+    with staged[kb.full_path].open("wb") as out:
+        np.save(out, np.asarray(full, dtype="float32"))
+    unprojected = staged[_index_file(kb)]
+    staged[_index_file(kb)] = _write_index_file(kb, proj.apply_rows(full), "proj")
+    unprojected.unlink()
+    staged[kb.projection_path] = kb.projection_path.with_suffix(".staged.npz")
+    proj.save(staged[kb.projection_path])
+    stats["projection"] = {"dim": proj.dim, "whiten": proj.whiten, "explained": round(proj.explained, 4)}
+    return proj
+
+def _staged_index(kb: KB, stage: str) -> Path:
+    path = _index_file(kb)
+    return path.with_suffix(f".{stage}.tmp{path.suffix}")
+
+def _write_index_file(kb: KB, vecs: np.ndarray, stage: str) -> Path:
+    """Write `vecs` as a staged index file (see `_publish()`); returns its path."""
+    tmp = _staged_index(kb, stage)
+    if faiss is not None:
+        index = faiss.IndexFlatIP(vecs.shape[1])
+        index.add(np.ascontiguousarray(vecs, dtype="float32"))
+        faiss.write_index(index, str(tmp))
+    else:
+        with tmp.open("wb") as out:
+            np.save(out, vecs)
+    return tmp
+
+def update_index(changed: Iterable[str] | None, kb: KB = DEFAULT_KB, progress: Callable[[Dict[str, float]], None] | None = None) -> Dict | None:
+    """Apply edits of the KB files named in `changed` (added, modified or removed; names
+    relative to `kb.kb_dir`, None = check every file) to the existing index, re-embedding
+    only the chunks of those files.
+
+    Files whose sha256 still matches the manifest are skipped (touches, no-op saves); if
+    nothing really changed, returns None without writing anything. Chunks from changed files
+    are dropped with their vectors. Files that shared a collapsed duplicate with such a
+    chunk are re-read too, so no text is lost to deduplication, and the near-duplicate
+    filter is seeded with the chunks kept. Publishes like `build_index()` (metadata renamed
+    last). Falls back to a full build when there is no index with per-file digests.
+    """
+    with kb_lock(("build", kb.name)):
+        manifest = artifacts.read_manifest(kb.cache_dir)
+        if manifest is None or "sources" not in manifest or not (_index_file(kb).exists() and kb.meta_path.exists()):
+            return _build_full(progress, kb)
+        t0 = time.perf_counter()
+        digests = dict(manifest["sources"])
+        if changed is None:
+            changed = set(digests) | {p.name for p in iter_kb_files(kb.kb_dir)}
+        touched = set()
+        for name in set(changed):
+            path = kb.kb_dir / name
+            try:
+                digest = artifacts.sha256_file(path) if is_kb_name(name) and path.is_file() else None
+            except FileNotFoundError:
+                digest = None  # removed while we looked
+            if digest != digests.get(name):
+                touched.add(name)
+                if digest is None:
+                    del digests[name]
+                else:
+                    digests[name] = digest
+        if not touched:
+            return None
+
+        old_meta = json.loads(kb.meta_path.read_text(encoding="utf-8"))
+        vecs = np.load(str(kb.full_path)) if manifest.get("projection") else _read_vectors(kb)
+        # Dropping a chunk also drops its text for the other files it was collapsed from
+        reread = set(touched)
+        while True:
+            extra = {s for c in old_meta if c["source"] in reread for s in chunk_sources(c)} - reread
+            if not extra:
+                break
+            reread |= extra
+        rows = [i for i, c in enumerate(old_meta) if c["source"] not in reread]
+        kept = [dict(old_meta[i], sources=[s for s in chunk_sources(old_meta[i]) if s not in reread]) for i in rows]
+        files = [kb.kb_dir / n for n in sorted(reread) if n in digests]
+
+        dedup = NearDuplicateFilter(DEDUP_THRESHOLD) if DEDUP_THRESHOLD <= 1.0 else None
+        if dedup is not None:
+            for c in kept:
+                dedup.register(c["text"])
+        merged: Dict[int, List[str]] = {}
+        added: List[Dict] = []
+        added_vecs: List[np.ndarray] = []
+
+        def keep(c: Chunk) -> bool:
+            dup = dedup.add(c.text) if dedup is not None else None
+            if dup is None:
+                return True
+            merged.setdefault(dup, []).append(c.source)
+            return False
+
+        def sink(batch: List[Chunk], emb: np.ndarray) -> None:
+            added.extend(dict(asdict(c), sources=[c.source]) for c in batch)
+            added_vecs.append(emb)
+
+        model = _get_model()
+        ingest = run_ingest(files, lambda batch: _encode_chunks(model, batch), sink, progress=progress, keep=keep)
+        meta = kept + added
+        for i, srcs in merged.items():
+            meta[i]["sources"] += [s for s in srcs if s not in meta[i]["sources"]]
+        if not meta:
+            raise RuntimeError(f"No knowledge base chunks found in {kb.kb_dir}")
+        vecs = np.concatenate([vecs[rows]] + added_vecs).astype("float32")
+
+        meta_tmp = kb.meta_path.with_suffix(".tmp")
+        with meta_tmp.open("w", encoding="utf-8") as f:
+            f.write("[\n" + ",\n".join(json.dumps(c, ensure_ascii=False) for c in meta) + "\n]\n")
+        index_tmp = _write_index_file(kb, vecs, "update")
+
+        section_sums: Dict[str, np.ndarray] = {}
+        for c, vec in zip(meta, vecs):
+            key = _section_key(c["source"], c.get("headings") or [])
+            section_sums[key] = section_sums[key] + vec if key in section_sums else vec.copy()
+        old_facts = json.loads(kb.facts_path.read_text(encoding="utf-8")) if kb.facts_path.exists() else {}
+        facts = merge_facts(old_facts, extract_facts(files), reread)
+        stats = {
+            "docs": len(files), "chunks": len(meta), "added": len(added), "removed": len(old_meta) - len(rows),
+            "duplicates": ingest["duplicates"], "changed": sorted(touched), "reread": sorted(reread), "dim": int(vecs.shape[1]), "incremental": True,
+        }
+        stats = _publish(kb, index_tmp, meta_tmp, section_sums, lambda: vecs, facts, digests, stats)
+        stats["seconds"] = round(time.perf_counter() - t0, 3)
+        return stats
+
+def _read_vectors(kb: KB, path: Path | None = None) -> np.ndarray:
+    """Vectors of the index file (at the projected width when a projection is in use)."""
+    path = path or _index_file(kb)
+    if faiss is not None:
+        index = faiss.read_index(str(path))
+        return index.reconstruct_n(0, index.ntotal)
+    return np.load(str(path))
+
+def _merge_sources(meta_path: Path, merged: Dict[int, List[str]]) -> None:
+    """Rewrite streamed metadata (one chunk per line) adding sources of collapsed duplicates."""
+    out_path = meta_path.with_suffix(".merged.tmp")
+    i = 0
+    with meta_path.open("r", encoding="utf-8") as src, out_path.open("w", encoding="utf-8") as out:
+        for line in src:
+            body = line.rstrip().rstrip(",")
+            if not body.startswith("{"):
+                out.write(line)
+                continue
+            if i in merged:
+                item = json.loads(body)
+                item["sources"] += [s for s in merged[i] if s not in item["sources"]]
+                line = json.dumps(item, ensure_ascii=False) + line[len(body):]
+            out.write(line)
+            i += 1
+    os.replace(out_path, meta_path)
 
-    with META_PATH.open("w", encoding="utf-8") as f:
-        json.dump([c.__dict__ for c in all_chunks], f, ensure_ascii=False, indent=2)
+def chunk_sources(chunk: Dict) -> List[str]:
+    """All KB files a chunk's text appears in (primary source first)."""
+    return list(chunk.get("sources") or ([chunk["source"]] if chunk.get("source") else []))
 
-    return {"docs": len(docs), "chunks": len(all_chunks), "dim": int(emb.shape[1])}
+def _section_key(source: str, headings: Sequence[str]) -> str:
+    return source + "\x1f" + " > ".join(headings)
 
-def _load():
+@dataclass
+class _Partitions:
+    """Chunk-id partitions for filtered and two-level search."""
+    by_source: Dict[str, np.ndarray]
+    by_category: Dict[str, np.ndarray]
+    section_ids: List[np.ndarray]
+    section_sources: List[str]
+    section_vecs: np.ndarray | None
+
+def _build_partitions(meta: List[Dict], centroids_path: Path) -> _Partitions:
+    groups: Dict[str, Dict[str, List[int]]] = {"source": {}, "category": {}, "section": {}}
+    for i, c in enumerate(meta):
+        for src in chunk_sources(c):
+            groups["source"].setdefault(src, []).append(i)
+        groups["category"].setdefault((c.get("category") or "").lower(), []).append(i)
+        groups["section"].setdefault(_section_key(c.get("source", ""), c.get("headings") or []), []).append(i)
+
+    def arrays(d: Dict[str, List[int]]) -> Dict[str, np.ndarray]:
+        return {k: np.asarray(v, dtype="int64") for k, v in d.items()}
+
+    section_ids: List[np.ndarray] = []
+    section_sources: List[str] = []
+    section_vecs = None
+    if centroids_path.exists():
+        with np.load(str(centroids_path)) as z:
+            labels = [str(x) for x in z["labels"]]
+            vecs = z["vectors"].astype("float32")
+        keep = [j for j, lab in enumerate(labels) if lab in groups["section"]]
+        section_ids = [np.asarray(groups["section"][labels[j]], dtype="int64") for j in keep]
+        section_sources = [labels[j].split("\x1f", 1)[0] for j in keep]
+        section_vecs = vecs[keep] if keep else None
+    return _Partitions(arrays(groups["source"]), arrays(groups["category"]), section_ids, section_sources, section_vecs)
+
+def _resident_bytes(loaded: Dict) -> int:
+    return loaded["bytes"]
+
+def _load_all(kb: KB = DEFAULT_KB) -> Dict:
+    """Load (and cache per KB generation) the index, metadata and partitions of `kb`.
+
+    The artifacts are checked against their manifest (checksums, embedder, index format)
+    once per generation; an incompatible or corrupt index raises `ArtifactError`. Without a
+    usable index the KB is embedded here only if `INDEX_AUTOBUILD` is on. Loaded KBs share
+    the `RESIDENT` memory budget with the FAQ tables and are evicted least-recently-used.
+    """
+    remote = bool(SHARD_ADDRS) and kb is DEFAULT_KB
+    with kb_lock(("index", kb.name)):
+        needed = [kb.meta_path, kb.facts_path] if remote else [_index_file(kb), kb.meta_path, kb.facts_path]
+        if not kb.manifest_path.exists() or not all(p.exists() for p in needed):
+            if not INDEX_AUTOBUILD:
+                raise ArtifactError(f"No index artifacts in {kb.cache_dir}: run scripts/build_index.py or set INDEX_BUNDLE")
+            build_index(kb=kb)
+        gen = kb_generation(kb)
+
+        def load() -> Dict:
+            manifest = artifacts.read_manifest(kb.cache_dir)
+            artifacts.verify(manifest, embedder_info(), _index_format(), [_artifact_name(p, kb) for p in needed], cache_dir=kb.cache_dir)
+            if remote:
+                index_or_emb, nbytes = None, 0  # vectors live in the shard servers
+            elif faiss is not None:
+                index_or_emb = faiss.read_index(str(kb.index_path))
+                nbytes = index_or_emb.ntotal * index_or_emb.d * 4
+            else:
+                index_or_emb = np.load(str(kb.emb_path)).astype('float32')
+                nbytes = index_or_emb.nbytes
+            proj = full = None
+            if manifest.get("projection"):
+                # Reduced-width index: queries are projected; full-width vectors for rescoring
+                # are memory-mapped (paged in by the OS, not counted in the budget)
+                rescore = INDEX_PCA_RESCORE > 0 and not remote
+                extra = [kb.projection_path] + ([kb.full_path] if rescore else [])
+                artifacts.verify(manifest, embedder_info(), _index_format(), [_artifact_name(p, kb) for p in extra], cache_dir=kb.cache_dir)
+                proj = Projection.load(kb.projection_path)
+                full = np.load(str(kb.full_path), mmap_mode="r") if rescore else None
+                nbytes += proj.matrix.nbytes
+            meta = json.loads(kb.meta_path.read_text(encoding='utf-8'))
+            parts = _build_partitions(meta, kb.centroids_path)
+            # Parsed chunk dicts take a few times their JSON size
+            nbytes += 3 * kb.meta_path.stat().st_size + (parts.section_vecs.nbytes if parts.section_vecs is not None else 0)
+            # Replaced, never mutated: concurrent readers keep a consistent snapshot.
+            return {
+                "gen": gen, "index": index_or_emb, "meta": meta, "parts": parts, "manifest": manifest,
+                "proj": proj, "full": full, "bytes": int(nbytes),
+            }
+
+        return RESIDENT.get(("index", kb.name), load, _resident_bytes, valid=lambda loaded: loaded["gen"] == gen)
+
+def load_kb(kb: KB = DEFAULT_KB) -> Dict:
+    """Load `kb`'s index (building it first if allowed); returns its manifest."""
+    return _load_all(kb)["manifest"]
+
+def prepare_index() -> Dict:
+    """Startup hook: install `INDEX_BUNDLE` if it is not the local index version, then load
+    and verify the default KB's index. Returns the manifest of the index being served.
+    Other KBs are loaded on first use."""
+    if INDEX_BUNDLE:
+        bundle = Path(INDEX_BUNDLE)
+        local = artifacts.read_manifest()
+        if local is None or local.get("version") != artifacts.bundle_manifest(bundle).get("version"):
+            _install_bundle(bundle)
+        else:
+            try:
+                return _load_all()["manifest"]
+            except ArtifactError:
+                _install_bundle(bundle)  # same version but damaged locally: reinstall
+    return _load_all()["manifest"]
+
+def _install_bundle(bundle: Path) -> None:
+    with kb_lock(("index", DEFAULT_KB.name)):
+        artifacts.install_bundle(bundle, embedder_info(), _index_format(), last=_artifact_name(DEFAULT_KB.meta_path))
+
+def index_info(kb: KB = DEFAULT_KB) -> Dict | None:
+    """Manifest summary of `kb`'s loaded index (None while it is not resident)."""
+    loaded = RESIDENT.peek(("index", kb.name))
+    if loaded is None:
+        return None
+    m = loaded["manifest"]
+    return {k: m.get(k) for k in ("version", "created", "kb_hash", "chunks", "dim", "index_format", "projection")} | {"embedder": m["embedder"]}
+
+def _load(kb: KB = DEFAULT_KB):
     """Load the vector index + metadata.
 
     Returns (index_or_embeddings, meta).
     - If FAISS is available: index_or_embeddings is a FAISS index.
     - Otherwise: index_or_embeddings is a NumPy array of normalized embeddings.
     """
-    if faiss is not None:
-        if not INDEX_PATH.exists() or not META_PATH.exists():
-            build_index()
-        index = faiss.read_index(str(INDEX_PATH))
-        meta = json.loads(META_PATH.read_text(encoding='utf-8'))
-        return index, meta
-
-    # NumPy fallback
-    if not EMB_PATH.exists() or not META_PATH.exists():
-        build_index()
-    emb = np.load(str(EMB_PATH)).astype('float32')
-    meta = json.loads(META_PATH.read_text(encoding='utf-8'))
-    return emb, meta
+    loaded = _load_all(kb)
+    return loaded["index"], loaded["meta"]
 
 _STOPWORDS = set([
     "the","a","an","and","or","to","of","in","on","for","with","is","are","do","does","can","we","you","your","our",
@@ -160,32 +551,171 @@ def lexical_overlap_ratio(question: str, text: str) -> float:
     inter = q.intersection(t)
     return len(inter) / max(1, len(q))
 
-def retrieve(question: str) -> Tuple[List[Dict], float]:
-    index_or_emb, meta = _load()
-    model = _get_model()
-
-    q_emb = model.encode([question], normalize_embeddings=True, show_progress_bar=False)
-    q_emb = np.asarray(q_emb, dtype='float32')[0]
-
+def _mmr(q_emb: np.ndarray, vecs: np.ndarray, k: int, lam: float) -> List[int]:
+    """Maximal Marginal Relevance: greedily pick rows of `vecs` that are similar to the
+    query but dissimilar to rows already picked. Returns positions into `vecs`."""
+    rel = vecs @ q_emb
+    picked: List[int] = []
+    max_sim = np.zeros(len(vecs), dtype="float32")
+    remaining = np.ones(len(vecs), dtype=bool)
+    while len(picked) < min(k, len(vecs)):
+        gain = lam * rel - (1.0 - lam) * max_sim if picked else rel
+        gain = np.where(remaining, gain, -np.inf)
+        j = int(np.argmax(gain))
+        picked.append(j)
+        remaining[j] = False
+        max_sim = np.maximum(max_sim, vecs @ vecs[j]) if len(picked) > 1 else vecs @ vecs[j]
+    return picked
+
+def kb_version(kb: KB = DEFAULT_KB) -> str:
+    """Content version of the served index: the manifest version, which stays the same across
+    rebuilds of an unchanged KB (unlike `kb_generation`)."""
+    manifest = _load_all(kb).get("manifest") or {}
+    return manifest.get("version") or str(kb_generation(kb))
+
+def kb_generation(kb: KB = DEFAULT_KB) -> int:
+    """Identifies the current on-disk index build (changes on every rebuild)."""
+    try:
+        return kb.meta_path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+@lru_cache(maxsize=1024)
+def embed_query(question: str) -> np.ndarray:
+    """Normalized query embedding. Memoized (read-only arrays): the core FAQ router and the
+    RAG tier embed the same normalized question."""
+    q_emb = np.asarray(_get_model().encode([question], normalize_embeddings=True, show_progress_bar=False), dtype='float32')[0]
+    q_emb.setflags(write=False)
+    return q_emb
+
+def embed_texts(texts: Sequence[str]) -> np.ndarray:
+    emb = _get_model().encode(list(texts), normalize_embeddings=True, batch_size=32, show_progress_bar=False)
+    return np.asarray(emb, dtype="float32")
+
+def _search(
+    index_or_emb, q_emb: np.ndarray, k: int, ids: np.ndarray | None = None, with_vectors: bool = False,
+) -> Tuple[List[Tuple[float, int]], np.ndarray | None]:
+    """Inner-product top-k as (score, chunk id) pairs, optionally restricted to chunk `ids`
+    (a FAISS ID selector, or a masked NumPy product), plus the hits' vectors if asked.
+    Without a local index (`SHARD_ADDRS` set), the query is scattered to the shard servers."""
+    if ids is not None and len(ids) == 0:
+        return [], None
+    if index_or_emb is None:
+        return shards.scatter_search(q_emb, k, ids, with_vectors=with_vectors)
     if faiss is not None:
-        scores, ids = index_or_emb.search(np.asarray([q_emb], dtype='float32'), TOP_K)
-        scores = scores[0].tolist()
-        ids = ids[0].tolist()
-    else:
-        emb = index_or_emb
-        sims = emb @ q_emb
-        ids = np.argsort(-sims)[:TOP_K].tolist()
-        scores = sims[ids].tolist()
+        params = None
+        if ids is not None:
+            ids = np.ascontiguousarray(ids, dtype="int64")
+            params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(ids.size, faiss.swig_ptr(ids)))
+        scores, found = index_or_emb.search(np.asarray([q_emb], dtype='float32'), k, params=params)
+        pairs = [(float(s), int(i)) for s, i in zip(scores[0], found[0]) if i != -1]
+        vecs = np.stack([index_or_emb.reconstruct(i) for _, i in pairs]) if with_vectors and pairs else None
+        return pairs, vecs
+
+    emb = index_or_emb if ids is None else index_or_emb[ids]
+    sims = emb @ q_emb
+    k = min(k, len(sims))
+    if k <= 0:
+        return [], None
+    top = np.argpartition(-sims, k - 1)[:k]
+    top = top[np.argsort(-sims[top])]
+    found = top if ids is None else ids[top]
+    pairs = [(float(sims[j]), int(i)) for j, i in zip(top, found)]
+    return pairs, (emb[top] if with_vectors else None)
+
+def _rescore(
+    full: np.ndarray, q_emb: np.ndarray, pairs: List[Tuple[float, int]], k: int, with_vectors: bool = False,
+) -> Tuple[List[Tuple[float, int]], np.ndarray | None]:
+    """Re-rank candidates found at the projected width by their full-width inner product."""
+    if not pairs:
+        return [], None
+    ids = np.asarray([i for _, i in pairs], dtype="int64")
+    vecs = np.asarray(full[ids], dtype="float32")
+    sims = vecs @ q_emb
+    top = np.argsort(-sims, kind="stable")[:k]
+    return [(float(sims[j]), int(ids[j])) for j in top], (vecs[top] if with_vectors else None)
+
+def _filter_ids(parts: _Partitions, sources: Sequence[str] | None, categories: Sequence[str] | None) -> np.ndarray | None:
+    """Chunk ids matching any of `sources` AND any of `categories` (None = no filter)."""
+    empty = np.zeros(0, dtype="int64")
+    ids = None
+    if sources:
+        ids = np.unique(np.concatenate([parts.by_source.get(s, empty) for s in sources]))
+    if categories:
+        cat = np.unique(np.concatenate([parts.by_category.get(c.lower(), empty) for c in categories]))
+        ids = cat if ids is None else np.intersect1d(ids, cat)
+    return ids
+
+def _coarse_ids(parts: _Partitions, q_emb: np.ndarray, allowed: np.ndarray | None) -> np.ndarray | None:
+    """Coarse level: chunk ids of the `COARSE_SECTIONS` sections whose centroids are
+    closest to the query (within `allowed`). Returns `allowed` when disabled."""
+    if COARSE_SECTIONS <= 0 or parts.section_vecs is None:
+        return allowed
+    sims = parts.section_vecs @ q_emb
+    if allowed is not None:
+        usable = np.array([np.isin(ids, allowed).any() for ids in parts.section_ids])
+        sims = np.where(usable, sims, -np.inf)
+    top = [j for j in np.argsort(-sims)[:COARSE_SECTIONS] if np.isfinite(sims[j])]
+    if not top:
+        return allowed
+    ids = np.concatenate([parts.section_ids[j] for j in top])
+    return ids if allowed is None else np.intersect1d(ids, allowed)
+
+def retrieve(
+    question: str,
+    mmr_lambda: float | None = None,
+    q_emb: np.ndarray | None = None,
+    sources: Sequence[str] | None = None,
+    categories: Sequence[str] | None = None,
+    strict: bool = True,
+    kb: KB = DEFAULT_KB,
+) -> Tuple[List[Dict], float]:
+    """Top-`TOP_K` chunks for `question` and the best similarity score.
+
+    `sources` / `categories` restrict the search to matching chunks. With `strict=False`
+    they are only a hint (e.g. detected intent): if the partition has no chunk above
+    `SIMILARITY_THRESHOLD`, the whole index is searched instead. With `COARSE_SECTIONS`
+    > 0 only the chunks of the closest sections (by centroid) are scanned.
+
+    With `mmr_lambda` < 1 (default `MMR_LAMBDA`), `MMR_CANDIDATES` nearest chunks are
+    re-selected with MMR so the returned chunks cover more distinct content. Pass `q_emb`
+    to reuse an already computed query embedding. `kb` selects the knowledge base searched.
+
+    If the index was built with a projection (`INDEX_PCA_DIM`), the search runs on the
+    projected query and the top `INDEX_PCA_RESCORE` candidates are rescored at full width.
+    """
+    loaded = _load_all(kb)
+    index_or_emb, meta, parts = loaded["index"], loaded["meta"], loaded["parts"]
+    proj, full = loaded.get("proj"), loaded.get("full")
+    lam = MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    k = max(TOP_K, MMR_CANDIDATES) if lam < 1.0 else TOP_K
+
+    if q_emb is None:
+        q_emb = embed_query(question)
+    q_search = proj.apply(q_emb) if proj is not None else q_emb
+    use_mmr = lam < 1.0
+
+    def search(ids: np.ndarray | None) -> Tuple[List[Tuple[float, int]], np.ndarray | None]:
+        if full is None:
+            return _search(index_or_emb, q_search, k, ids, with_vectors=use_mmr)
+        pairs, _ = _search(index_or_emb, q_search, max(k, INDEX_PCA_RESCORE), ids)
+        return _rescore(full, q_emb, pairs, k, with_vectors=use_mmr)
+
+    allowed = _filter_ids(parts, sources, categories)
+    pairs, vecs = search(_coarse_ids(parts, q_search, allowed))
+    if allowed is not None and not strict and (not pairs or pairs[0][0] < SIMILARITY_THRESHOLD):
+        pairs, vecs = search(_coarse_ids(parts, q_search, None))
+    best = pairs[0][0] if pairs else 0.0
+
+    if use_mmr and vecs is not None and len(pairs) > TOP_K:
+        pairs = [pairs[j] for j in _mmr(q_emb if full is not None else q_search, vecs, TOP_K, lam)]
 
     results: List[Dict] = []
-    for s, i in zip(scores, ids):
-        if i == -1:
-            continue
+    for s, i in pairs[:TOP_K]:
         item = dict(meta[i])
         item['score'] = float(s)
         results.append(item)
 
-    best = float(scores[0]) if scores else 0.0
     return results, best
 
 def should_fallback(question: str, chunks: List[Dict], best_score: float) -> bool:
@@ -207,15 +737,81 @@ def should_fallback(question: str, chunks: List[Dict], best_score: float) -> boo
 
     return False
 
-def format_context(chunks: List[Dict], max_chars_total: int = 2400) -> str:
+_SENT_SPLIT_RE = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(])")
+
+def _split_sentences(line: str) -> List[str]:
+    return [s.strip() for s in _SENT_SPLIT_RE.split(line) if s.strip()]
+
+def _knapsack(items: List[Tuple[int, float]], budget: int) -> List[int]:
+    """0/1 knapsack over (cost, value) items. Returns indices of the chosen items."""
+    best = [0.0] * (budget + 1)
+    took = [[False] * (budget + 1) for _ in items]
+    for i, (cost, value) in enumerate(items):
+        for w in range(budget, cost - 1, -1):
+            if best[w - cost] + value > best[w]:
+                best[w] = best[w - cost] + value
+                took[i][w] = True
+    chosen = []
+    w = budget
+    for i in range(len(items) - 1, -1, -1):
+        if took[i][w]:
+            chosen.append(i)
+            w -= items[i][0]
+    return chosen[::-1]
+
+def format_context(chunks: List[Dict], question: str = "", max_tokens: int = CONTEXT_TOKENS) -> str:
+    """Pack the question-relevant sentences of `chunks` into a `max_tokens` LLM-token budget.
+
+    Each chunk is trimmed to sentences that share terms with the question (all sentences
+    if none do). Sentences are valued by term overlap weighted by the chunk's score and
+    rank, and the budget is filled with a 0/1 knapsack rather than stopping at the first
+    chunk that does not fit. Chunks keep their order and `[SOURCE: ...]` header.
+    """
+    q_toks = set(_tokenize(question))
+    sep_cost = count_tokens("\n---\n")
+
+    groups = []  # (header, fixed_cost, [(sentence, cost, value, relevant)])
+    for rank, c in enumerate(chunks):
+        lines = [ln.strip() for ln in c.get("text", "").splitlines() if ln.strip()]
+        heading = lines[0] if lines and lines[0].startswith("#") else ""
+        header = f"[SOURCE: {', '.join(chunk_sources(c))}]" + (f"\n{heading}" if heading else "")
+        weight = max(float(c.get("score", 0.0)), 0.05) / (1.0 + 0.25 * rank)
+        sents = []
+        for ln in (lines[1:] if heading else lines):
+            for sent in _split_sentences(ln):
+                toks = set(_tokenize(sent))
+                rel = len(q_toks & toks) / len(q_toks) if q_toks else 0.0
+                sents.append((sent, count_tokens(sent + "\n"), weight * (rel + 0.05), rel > 0))
+        groups.append((header, count_tokens(header + "\n") + sep_cost, sents))
+
+    any_relevant = any(rel for _h, _f, sents in groups for *_x, rel in sents)
+    items = []  # (group index, sentence index)
+    reserved = 0
+    for g, (_header, fixed, sents) in enumerate(groups):
+        eligible = [i for i, s in enumerate(sents) if s[3] or not any_relevant]
+        if not eligible or reserved + fixed + min(sents[i][1] for i in eligible) > max_tokens:
+            continue
+        reserved += fixed
+        items.extend((g, i) for i in eligible)
+
+    chosen = set(items[i] for i in _knapsack([groups[g][2][i][1:3] for g, i in items], max(0, max_tokens - reserved)))
+
+    # Headers of chunks that got nothing are freed: top up the remaining budget greedily.
+    used_groups = {g for g, _ in chosen}
+    spent = sum(groups[g][1] for g in used_groups) + sum(groups[g][2][i][1] for g, i in chosen)
+    for g, i in sorted(items, key=lambda it: groups[it[0]][2][it[1]][2] / groups[it[0]][2][it[1]][1], reverse=True):
+        if (g, i) in chosen or g not in used_groups:
+            continue
+        cost = groups[g][2][i][1]
+        if spent + cost <= max_tokens:
+            chosen.add((g, i))
+            spent += cost
+
     out = []
-    used = 0
-    for c in chunks:
-        block = f"[SOURCE: {c['source']}]\n{c['text']}\n"
-        if used + len(block) > max_chars_total:
-            break
-        out.append(block)
-        used += len(block)
+    for g, (header, _fixed, sents) in enumerate(groups):
+        picked = [sents[i][0] for i in range(len(sents)) if (g, i) in chosen]
+        if picked:
+            out.append(header + "\n" + "\n".join(picked) + "\n")
     return "\n---\n".join(out)
 
 
@@ -241,7 +837,7 @@ def answer_from_chunks(question: str, chunks: List[Dict], max_lines: int = 5) ->
     # Flatten candidate lines
     candidates = []
     for c in chunks:
-        src = c.get("source", "")
+        srcs = chunk_sources(c)
         for line in c.get("text","").splitlines():
             ln = line.strip()
             if not ln:
@@ -259,7 +855,7 @@ def answer_from_chunks(question: str, chunks: List[Dict], max_lines: int = 5) ->
             if low in {"services", "pricing & payments", "support & sla", "policies", "engagement process"}:
                 continue
 
-            candidates.append((ln, src))
+            candidates.append((ln, srcs))
 
     def score(line: str) -> float:
         l = line.lower()
@@ -298,7 +894,7 @@ def answer_from_chunks(question: str, chunks: List[Dict], max_lines: int = 5) ->
 
     picked: List[Tuple[str, str]] = []
     used = set()
-    for ln, src in ranked:
+    for ln, srcs in ranked:
         if len(picked) >= max_lines:
             break
         key = ln.lower()
@@ -310,48 +906,56 @@ def answer_from_chunks(question: str, chunks: List[Dict], max_lines: int = 5) ->
         # ensure at least mildly relevant
         if score(ln) <= 0.2 and kws:
             continue
-        picked.append((ln, src))
+        picked.append((ln, srcs))
         used.add(key)
 
     # fallback: take first few non-empty lines if scoring didn't pick anything
     if not picked:
-        for ln, _src in candidates[:max_lines]:
+        for ln, srcs in candidates[:max_lines]:
             if ln.lower() not in used:
-                picked.append((ln, src))
+                picked.append((ln, srcs))
                 used.add(ln.lower())
             if len(picked) >= max_lines:
                 break
 
     used_sources = []
     out_lines = []
-    for ln, src in picked:
+    for ln, srcs in picked:
         out_lines.append(ln)
-        if src and src not in used_sources:
-            used_sources.append(src)
+        for src in srcs:
+            if src and src not in used_sources:
+                used_sources.append(src)
     return "\n".join(out_lines), used_sources
 
 
+# Intent keywords -> KB file they point to, with its rerank boost. Also used to narrow
+# retrieval to those files (see `detect_sources`).
+_INTENT_SOURCES = [
+    (("reschedul", "refund", "privacy", "policy"), "policies.md", 2.0),
+    (("sla", "severity", "support hour", "business hour", "outage"), "support.md", 2.0),
+    (("pricing", "price", "payment", "milestone", "fixed price", "time & materials", "time and materials", "t&m"), "pricing.md", 2.0),
+    (("process", "nda", "sprint", "engagement"), "process.md", 1.5),
+    (("service", "discovery", "mvp"), "services.md", 1.5),
+]
+
+def detect_sources(question: str) -> List[str]:
+    """KB files the question's intent points to (empty if no intent keyword matches)."""
+    q = question.lower()
+    out: List[str] = []
+    for kws, src, _boost in _INTENT_SOURCES:
+        if src not in out and any(k in q for k in kws):
+            out.append(src)
+    return out
+
 def rerank_chunks(question: str, chunks: List[Dict]) -> List[Dict]:
     """Lightweight source-aware reranking to improve precision for certain intents."""
     q = question.lower()
     def boost(c: Dict) -> float:
-        src = (c.get("source") or "").lower()
+        srcs = [s.lower() for s in chunk_sources(c)]
         b = 0.0
-        if any(k in q for k in ["reschedul", "refund", "privacy", "policy"]):
-            if "policies.md" in src:
-                b += 2.0
-        if any(k in q for k in ["sla", "severity", "support hour", "business hour", "outage"]):
-            if "support.md" in src:
-                b += 2.0
-        if any(k in q for k in ["pricing", "price", "payment", "milestone", "fixed price", "time & materials", "time and materials", "t&m"]):
-            if "pricing.md" in src:
-                b += 2.0
-        if any(k in q for k in ["process", "nda", "sprint", "engagement"]):
-            if "process.md" in src:
-                b += 1.5
-        if any(k in q for k in ["service", "discovery", "mvp"]):
-            if "services.md" in src:
-                b += 1.5
+        for kws, name, w in _INTENT_SOURCES:
+            if any(k in q for k in kws) and any(name in src for src in srcs):
+                b += w
         return b
 
     # sort by (boost + similarity) if similarity available; otherwise by boost only
@@ -0,0 +1,78 @@
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+class SemanticRouter:
+    """Nearest-FAQ classifier over pre-embedded core questions and aliases.
+
+    Every example text is embedded once; `route()` scores a query against all of them with
+    one matrix-vector product and takes the best example per FAQ. Each FAQ has its own
+    threshold, calibrated on the examples: the highest similarity any *other* FAQ's example
+    reaches against this FAQ's examples, plus `margin`, clipped to [min_sim, max_sim]. FAQs
+    whose wording overlaps with others therefore need a closer match to claim a question.
+    """
+
+    def __init__(
+        self,
+        examples: Sequence[Tuple[str, int]],
+        encode: Callable[[List[str]], np.ndarray],
+        min_sim: float = 0.6,
+        max_sim: float = 0.92,
+        margin: float = 0.02,
+    ):
+        examples = sorted(examples, key=lambda e: e[1])  # group rows by FAQ for reduceat
+        self.texts = [t for t, _ in examples]
+        labels = np.asarray([i for _, i in examples], dtype="int64")
+        self.faq_ids, self._starts = np.unique(labels, return_index=True)
+        self._row_faq = np.searchsorted(self.faq_ids, labels)
+        self.vecs = np.asarray(encode(self.texts), dtype="float32") if self.texts else np.zeros((0, 0), dtype="float32")
+        self.thresholds = self._calibrate(min_sim, max_sim, margin)
+
+    def _calibrate(self, min_sim: float, max_sim: float, margin: float) -> np.ndarray:
+        n_faq = len(self.faq_ids)
+        if n_faq == 0:
+            return np.zeros(0, dtype="float32")
+        sims = self.vecs @ self.vecs.T
+        # per row: best similarity to each FAQ's examples -> (rows, faqs)
+        per_faq = np.maximum.reduceat(sims, self._starts, axis=1)
+        own = self._row_faq[:, None] == np.arange(n_faq)[None, :]
+        impostor = np.where(own, -np.inf, per_faq).max(axis=0)
+        thr = np.clip(impostor + margin, min_sim, max_sim)
+        return np.where(np.isfinite(thr), thr, min_sim).astype("float32")
+
+    def scores(self, q_emb: np.ndarray) -> np.ndarray:
+        """Best example similarity per FAQ (aligned with `faq_ids`)."""
+        return np.maximum.reduceat(self.vecs @ q_emb, self._starts)
+
+    def route(self, q_emb: np.ndarray) -> Optional[Tuple[int, float]]:
+        """(faq id, similarity) of the best FAQ if it clears that FAQ's threshold, else None."""
+        if not len(self.faq_ids):
+            return None
+        s = self.scores(q_emb)
+        j = int(np.argmax(s))
+        if s[j] < self.thresholds[j]:
+            return None
+        return int(self.faq_ids[j]), float(s[j])
+
+    def describe(self) -> List[Dict]:
+        return [
+            {"id": int(i), "examples": int(n), "threshold": round(float(t), 3)}
+            for i, n, t in zip(self.faq_ids, np.diff(np.append(self._starts, len(self.texts))), self.thresholds)
+        ]
+
+
+def faq_examples(items: Iterable[Mapping], aliases: Iterable[Mapping], norm: Callable[[str], str]) -> List[Tuple[str, int]]:
+    """(normalized text, faq id) for every core question and alias pointing at a known FAQ."""
+    ids = set()
+    out: List[Tuple[str, int]] = []
+    for it in items:
+        if it.get("question"):
+            ids.add(int(it["id"]))
+            out.append((norm(it["question"]), int(it["id"])))
+    for a in aliases:
+        cid = int(a.get("core_id", 0))
+        if a.get("alias") and cid in ids:
+            out.append((norm(a["alias"]), cid))
+    return out
@@ -0,0 +1,179 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor, wait
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Sequence, Tuple
+from urllib.request import Request, urlopen
+
+import numpy as np
+
+from .config import CACHE_DIR, SHARD_ADDRS, SHARD_TIMEOUT_S
+
+SHARDS_DIR = CACHE_DIR / "shards"
+
+def shard_path(i: int, shards_dir: Path = SHARDS_DIR) -> Path:
+    return shards_dir / f"shard_{i}.npz"
+
+def write_shards(vecs: np.ndarray, n_shards: int, shards_dir: Path = SHARDS_DIR) -> int:
+    """Split normalized chunk vectors round-robin into `n_shards` files. Each shard keeps the
+    global chunk ids of its rows, so per-shard hits merge back into one ranking."""
+    for path, tmp in stage_shards(vecs, n_shards, shards_dir).items():
+        os.replace(tmp, path)
+    return n_shards
+
+def stage_shards(vecs: np.ndarray, n_shards: int, shards_dir: Path = SHARDS_DIR) -> Dict[Path, Path]:
+    """Like `write_shards()`, but leaves the new shards at temporary paths for the caller to
+    rename; returns {shard path: temporary path}."""
+    shards_dir.mkdir(parents=True, exist_ok=True)
+    for old in shards_dir.glob("shard_*.npz"):
+        m = re.fullmatch(r"shard_(\d+)", old.stem)
+        if m is None or int(m.group(1)) >= n_shards:
+            old.unlink(missing_ok=True)  # shards beyond n_shards, or a temp file of an interrupted build
+    staged = {}
+    for i in range(n_shards):
+        ids = np.arange(i, len(vecs), n_shards, dtype="int64")
+        tmp = shards_dir / f"shard_{i}.tmp.npz"
+        with tmp.open("wb") as out:
+            np.savez(out, vectors=np.asarray(vecs[ids], dtype="float32"), ids=ids)
+        staged[shard_path(i, shards_dir)] = tmp
+    return staged
+
+
+class ShardIndex:
+    """One shard's vectors, reloaded when its file is rewritten by a new build."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._vecs = np.zeros((0, 0), dtype="float32")
+        self._ids = np.zeros(0, dtype="int64")
+
+    def _current(self) -> Tuple[np.ndarray, np.ndarray]:
+        mtime = self.path.stat().st_mtime_ns
+        with self._lock:
+            if mtime != self._mtime:
+                with np.load(str(self.path)) as z:
+                    self._vecs = z["vectors"].astype("float32")
+                    self._ids = z["ids"].astype("int64")
+                self._mtime = mtime
+            return self._vecs, self._ids
+
+    def search(self, q_emb: np.ndarray, k: int, ids: Sequence[int] | None = None, with_vectors: bool = False) -> Dict:
+        vecs, gids = self._current()
+        if ids is not None:
+            rows = np.nonzero(np.isin(gids, np.asarray(ids, dtype="int64")))[0]
+            sims = vecs[rows] @ q_emb if len(rows) else np.zeros(0, dtype="float32")
+        else:
+            rows = np.arange(len(gids))
+            sims = vecs @ q_emb  # no row gather: avoids copying the whole shard per query
+        if not len(rows) or k <= 0:
+            return {"scores": [], "ids": []}
+        k = min(k, len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        out = {"scores": sims[top].tolist(), "ids": gids[rows[top]].tolist()}
+        if with_vectors:
+            out["vectors"] = vecs[rows[top]].tolist()
+        return out
+
+
+def _handler(shard: ShardIndex):
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/search":
+                self.send_error(404)
+                return
+            try:
+                req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                res = shard.search(np.asarray(req["vector"], dtype="float32"), int(req["k"]), req.get("ids"), bool(req.get("vectors")))
+                body = json.dumps(res).encode("utf-8")
+                self.send_response(200)
+            except Exception as e:
+                body = json.dumps({"error": str(e)}).encode("utf-8")
+                self.send_response(500)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the gatherer gave up on this shard (timeout); nothing to deliver
+
+        def log_message(self, *args):  # quiet: one line per query is too noisy
+            pass
+
+    return Handler
+
+def serve_shard(path: Path, host: str = "127.0.0.1", port: int = 9100) -> None:
+    """Serve one shard over HTTP (`POST /search`) until interrupted."""
+    shard = ShardIndex(path)
+    shard._current()  # load before accepting queries, not on the first one
+    server = ThreadingHTTPServer((host, port), _handler(shard))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="shard")
+_COUNTS_LOCK = threading.Lock()
+_COUNTS = {"queries": 0, "shard_timeouts": 0, "shard_errors": 0}
+
+def _query_shard(addr: str, payload: bytes, timeout: float) -> Dict:
+    req = Request(f"http://{addr}/search", data=payload, headers={"Content-Type": "application/json"})
+    with urlopen(req, timeout=timeout) as r:
+        return json.loads(r.read().decode("utf-8"))
+
+def _count(key: str, n: int = 1) -> None:
+    with _COUNTS_LOCK:
+        _COUNTS[key] += n
+
+def scatter_search(
+    q_emb: np.ndarray,
+    k: int,
+    ids: Sequence[int] | None = None,
+    with_vectors: bool = False,
+    addrs: Sequence[str] = SHARD_ADDRS,
+    timeout: float = SHARD_TIMEOUT_S,
+) -> Tuple[List[Tuple[float, int]], np.ndarray | None]:
+    """Fan the query out to every shard in parallel and merge the per-shard top-k by score.
+
+    Shards that fail or do not answer within `timeout` are skipped, so one slow shard costs
+    recall on its partition rather than the whole request. Returns ((score, id) pairs, vectors
+    aligned with the pairs or None).
+    """
+    _count("queries")
+    payload = json.dumps({
+        "vector": np.asarray(q_emb, dtype="float32").tolist(),
+        "k": int(k),
+        "ids": None if ids is None else [int(i) for i in ids],
+        "vectors": with_vectors,
+    }).encode("utf-8")
+    futs = [_POOL.submit(_query_shard, a, payload, timeout) for a in addrs]
+    done, not_done = wait(futs, timeout=timeout)
+    if not_done:
+        _count("shard_timeouts", len(not_done))
+
+    hits: List[Tuple[float, int, List[float] | None]] = []
+    for f in done:
+        try:
+            res = f.result()
+        except Exception:
+            _count("shard_errors")
+            continue
+        vecs = res.get("vectors") or [None] * len(res.get("ids", []))
+        hits.extend(zip(res.get("scores", []), res.get("ids", []), vecs))
+    hits.sort(key=lambda h: -h[0])
+    hits = hits[:k]
+    pairs = [(float(s), int(i)) for s, i, _v in hits]
+    vectors = np.asarray([v for _s, _i, v in hits], dtype="float32") if with_vectors and hits else None
+    return pairs, vectors
+
+def stats() -> Dict[str, int]:
+    with _COUNTS_LOCK:
+        return dict(_COUNTS, shards=len(SHARD_ADDRS))
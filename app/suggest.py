@@ -0,0 +1,105 @@
+from __future__ import annotations
+from collections import Counter
+from types import MappingProxyType
+import re
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Tuple
+
+_TOKEN_RE = re.compile(r"[0-9a-z؀-ۿ]+")
+
+
+def _tokens(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower().replace("&", " and "))
+
+def _trigrams(text: str) -> FrozenSet[str]:
+    s = " " + " ".join(_tokens(text)) + " "
+    return frozenset(s[i:i + 3] for i in range(len(s) - 2))
+
+
+class SuggestIndex:
+    """Typeahead over canonical FAQ questions and their aliases.
+
+    A word-prefix trie answers "every typed word is a prefix of some word in the entry"; a
+    character-trigram index catches typos ("prcing modls") when the trie has too few hits.
+    Entries are grouped by FAQ id and every suggestion is the canonical question, so users are
+    steered to text the core FAQ tier answers directly. Built once; read-only afterwards.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, int]], canonical: Mapping[int, str], min_overlap: float = 0.35):
+        self.canonical = MappingProxyType(dict(canonical))
+        self.min_overlap = min_overlap
+        self._texts: List[str] = []
+        self._ids: List[int] = []
+        trie: Dict = {}
+        grams: Dict[str, set] = {}
+        for text, faq_id in entries:
+            if faq_id not in self.canonical or not text.strip():
+                continue
+            e = len(self._texts)
+            self._texts.append(text)
+            self._ids.append(faq_id)
+            for tok in set(_tokens(text)):
+                node = trie
+                for ch in tok:
+                    node = node.setdefault(ch, {})
+                    node.setdefault("", set()).add(e)  # "" holds the entries below this prefix
+            for g in _trigrams(text):
+                grams.setdefault(g, set()).add(e)
+        self._trie = _freeze(trie)
+        self._grams = MappingProxyType({g: frozenset(v) for g, v in grams.items()})
+
+    @classmethod
+    def from_faq(cls, items: Iterable[Mapping], aliases: Iterable[Mapping]) -> "SuggestIndex":
+        canonical = {int(it["id"]): it.get("question", "") for it in items if it.get("question")}
+        entries = [(q, i) for i, q in canonical.items()]
+        entries += [(a.get("alias", ""), int(a.get("core_id", 0))) for a in aliases]
+        return cls(entries, canonical)
+
+    def _prefix(self, tok: str) -> FrozenSet[int]:
+        node = self._trie
+        for ch in tok:
+            node = node.get(ch)
+            if node is None:
+                return frozenset()
+        return node.get("", frozenset())
+
+    def suggest(self, q: str, limit: int = 5) -> List[Dict]:
+        """Up to `limit` canonical questions for the typed text `q`, best first."""
+        toks = _tokens(q)
+        if not toks or limit <= 0:
+            return []
+        # Exact path: entries where every typed word prefixes one of their words
+        hits = self._prefix(toks[0])
+        for tok in toks[1:]:
+            if not hits:
+                break
+            hits = hits & self._prefix(tok)
+        typed = " ".join(toks)
+        scored: Dict[int, Tuple[float, int]] = {}  # faq id -> (score, entry)
+
+        def offer(faq_id: int, score: float, e: int) -> None:
+            if faq_id not in scored or score > scored[faq_id][0]:
+                scored[faq_id] = (score, e)
+
+        for e in hits:
+            # whole-text prefix first, then canonical over alias, then shorter text
+            text = " ".join(_tokens(self._texts[e]))
+            score = 2.0 + (1.0 if text.startswith(typed) else 0.0) + (0.1 if self._texts[e] == self.canonical[self._ids[e]] else 0.0)
+            offer(self._ids[e], score - len(text) / 1000.0, e)
+
+        if len(scored) < limit:
+            # Typo path: share of the query's trigrams found in the entry
+            qg = _trigrams(q)
+            counts: Counter = Counter()
+            for g in qg:
+                counts.update(self._grams.get(g, ()))
+            for e, n in counts.items():
+                overlap = n / len(qg)
+                if overlap >= self.min_overlap:
+                    offer(self._ids[e], overlap, e)
+
+        best = sorted(scored.items(), key=lambda kv: -kv[1][0])[:limit]
+        return [{"question": self.canonical[i], "id": i, "matched": self._texts[e]} for i, (_s, e) in best]
+
+
+def _freeze(node: Dict) -> Mapping:
+    return MappingProxyType({k: (frozenset(v) if k == "" else _freeze(v)) for k, v in node.items()})
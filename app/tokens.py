@@ -0,0 +1,37 @@
+from __future__ import annotations
+from functools import lru_cache
+
+try:
+    import tiktoken  # type: ignore
+except Exception:  # pragma: no cover
+    tiktoken = None  # type: ignore
+
+from .config import OPENAI_MODEL
+
+_ENCODING = None
+
+def _encoding():
+    global _ENCODING
+    if _ENCODING is None:
+        _ENCODING = False
+        if tiktoken is not None:
+            try:
+                _ENCODING = tiktoken.encoding_for_model(OPENAI_MODEL)
+            except Exception:
+                try:
+                    _ENCODING = tiktoken.get_encoding("o200k_base")
+                except Exception:
+                    _ENCODING = False
+    return _ENCODING
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    """LLM token count for `text` under the configured model's tokenizer.
+
+    Without tiktoken (or for Ollama models) this is an estimate: ~4 characters per token,
+    never fewer than the number of words.
+    """
+    enc = _encoding()
+    if enc:
+        return len(enc.encode(text))
+    return max(len(text.split()), (len(text) + 3) // 4)
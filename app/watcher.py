@@ -0,0 +1,262 @@
+from __future__ import annotations
+from pathlib import Path
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Set
+
+from .ingest import is_kb_name
+
+# inotify(7) event bits
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_IN_Q_OVERFLOW = 0x4000
+_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_DELETE_SELF | _IN_MOVE_SELF
+_EVENT = struct.Struct("iIII")  # wd, mask, cookie, len (name follows)
+
+
+class _InotifySource:
+    """File names changed in one directory, from Linux inotify (libc via ctypes)."""
+    kind = "inotify"
+    stale = False  # the watched folder itself was removed or moved: reopen
+
+    def __init__(self, directory: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), _MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+
+    def poll(self, timeout: float) -> Optional[Set[str]]:
+        """Names with events within `timeout` seconds; None if events were lost (rescan)."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+        names: Set[str] = set()
+        off = 0
+        while off + _EVENT.size <= len(data):
+            _wd, mask, _cookie, n = _EVENT.unpack_from(data, off)
+            off += _EVENT.size
+            name = data[off:off + n].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            off += n
+            if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF):
+                self.stale = True
+            if mask & (_IN_Q_OVERFLOW | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                return None
+            if name:
+                names.add(name)
+        return names
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+class _PollSource:
+    """mtime/size polling with a bounded cost per tick, independent of the number of files.
+
+    The directory listing is re-read only when the directory's own mtime changes (a file was
+    added, removed or renamed -- which includes editors' atomic saves). Files edited in place
+    are found by stat()ing at most `batch` files per tick, round-robin, so they are noticed
+    within ceil(files / batch) ticks.
+    """
+    kind = "poll"
+    stale = False
+
+    def __init__(self, directory: Path, interval: float, batch: int):
+        self.directory = directory
+        self.interval = interval
+        self.batch = max(1, batch)
+        self._dir_mtime = None
+        self._files: Dict[str, tuple] = {}
+        self._order: list = []
+        self._pos = 0
+        self._relist()
+
+    def _stat(self, name: str) -> Optional[tuple]:
+        try:
+            st = os.stat(self.directory / name)
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _relist(self) -> Set[str]:
+        self._dir_mtime = os.stat(self.directory).st_mtime_ns
+        current = {}
+        for e in os.scandir(self.directory):
+            try:
+                if e.is_file():
+                    st = e.stat()
+                    current[e.name] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                continue  # short-lived (editor temp) file, gone since the listing
+        changed = {n for n in set(current) | set(self._files) if current.get(n) != self._files.get(n)}
+        self._files = current
+        self._order = sorted(current)
+        self._pos = 0
+        return changed
+
+    def poll(self, timeout: float) -> Optional[Set[str]]:
+        time.sleep(min(timeout, self.interval))
+        changed: Set[str] = set()
+        if os.stat(self.directory).st_mtime_ns != self._dir_mtime:
+            changed |= self._relist()
+        for name in self._order[self._pos:self._pos + self.batch]:
+            sig = self._stat(name)
+            if sig != self._files.get(name):
+                changed.add(name)
+                self._files[name] = sig
+        self._pos = self._pos + self.batch if self._pos + self.batch < len(self._order) else 0
+        return changed
+
+    def close(self) -> None:
+        pass
+
+
+class KBWatcher:
+    """Background thread that applies KB file edits with `on_change(names)`.
+
+    Events are debounced: a batch is flushed once no new KB file event arrived for
+    `debounce_s`, or `max_delay_s` after its first event during a continuous burst.
+    `on_change(None)` means events were lost and every file must be checked. Uses inotify
+    when available (`backend="auto"`), else bounded mtime/size polling.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        on_change: Callable[[Optional[Iterable[str]]], object],
+        debounce_s: float = 1.0,
+        max_delay_s: float = 10.0,
+        tick_s: float = 0.5,
+        poll_batch: int = 64,
+        backend: str = "auto",
+        name: str = "kb-watcher",
+    ):
+        self.directory = directory
+        self.on_change = on_change
+        self.debounce_s = debounce_s
+        self.max_delay_s = max_delay_s
+        self.tick_s = tick_s
+        self.poll_batch = poll_batch
+        self.backend = backend
+        self.name = name
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._source = None
+        self._lock = threading.Lock()
+        self._counts = {"events": 0, "batches": 0, "updates": 0, "errors": 0}
+        self._last: Dict = {}
+        self._last_error: Optional[str] = None
+
+    def _open(self):
+        if self.backend in ("auto", "inotify"):
+            try:
+                return _InotifySource(self.directory)
+            except (OSError, AttributeError):
+                if self.backend == "inotify":
+                    raise
+        return _PollSource(self.directory, self.tick_s, self.poll_batch)
+
+    def start(self) -> "KBWatcher":
+        self._source = self._open()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _poll(self, wait: float) -> Optional[Set[str]]:
+        """Next batch of changed names. If the source fails (folder removed or replaced,
+        file gone mid-listing), back off, reopen it and report a rescan (None)."""
+        try:
+            if self._source is None:
+                self._source = self._open()
+                return None
+            names = self._source.poll(wait)
+            if self._source.stale:
+                self._source.close()
+                self._source = None
+            return names
+        except OSError as e:
+            with self._lock:
+                self._counts["errors"] += 1
+                self._last_error = f"{type(e).__name__}: {e}"
+            if self._source is not None:
+                try:
+                    self._source.close()
+                except OSError:
+                    pass
+                self._source = None
+            self._stop.wait(max(self.tick_s, 1.0))
+            return set()
+
+    def _run(self) -> None:
+        pending: Set[str] = set()
+        lost = False
+        first = last = 0.0
+        try:
+            while not self._stop.is_set():
+                wait = self.tick_s if not (pending or lost) else max(0.01, min(self.tick_s, last + self.debounce_s - time.monotonic()))
+                names = self._poll(wait)
+                now = time.monotonic()
+                relevant = None if names is None else {n for n in names if is_kb_name(n)}
+                if relevant is None or relevant:
+                    if not (pending or lost):
+                        first = now
+                    last = now
+                    lost = lost or relevant is None
+                    pending |= relevant or set()
+                    with self._lock:
+                        self._counts["events"] += len(relevant) if relevant else 1
+                if (pending or lost) and (now - last >= self.debounce_s or now - first >= self.max_delay_s):
+                    batch, pending = (None if lost else pending), set()
+                    lost = False
+                    self._flush(batch)
+        finally:
+            if self._source is not None:
+                self._source.close()
+
+    def _flush(self, names: Optional[Set[str]]) -> None:
+        t0 = time.perf_counter()
+        try:
+            result = self.on_change(None if names is None else sorted(names))
+            error = None
+        except Exception as e:  # keep watching; the next edit retries
+            result, error = None, f"{type(e).__name__}: {e}"
+        with self._lock:
+            self._counts["batches"] += 1
+            self._counts["updates"] += result is not None
+            self._counts["errors"] += error is not None
+            self._last = {
+                "files": None if names is None else sorted(names), "seconds": round(time.perf_counter() - t0, 3),
+                "updated": result is not None, "error": error, "time": time.time(),
+            }
+
+    def stats(self) -> Dict:
+        with self._lock:
+            kind = self._source.kind if self._source is not None else None
+            alive = self._thread is not None and self._thread.is_alive()
+            return dict(
+                self._counts, alive=alive, backend=kind, directory=str(self.directory),
+                last=dict(self._last), last_error=self._last_error,
+            )
@@ -0,0 +1,104 @@
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from app import rag
+from app.kbs import get_kb
+from app.projection import fit_projection
+
+
+def _top(sims, k):
+    k = min(k, len(sims))
+    top = np.argpartition(-sims, k - 1)[:k]
+    return top[np.argsort(-sims[top])]
+
+def _rescored(low, vecs, q_low, q, c, k):
+    """Top `c` at the projected width, re-ranked by full-width inner product."""
+    cand = _top(low @ q_low, c)
+    return cand[_top(vecs[cand] @ q, k)]
+
+def _kb_vectors(name):
+    """Full-width chunk vectors of a built KB (built first if needed) and its test questions."""
+    kb = get_kb(name)
+    manifest = rag.load_kb(kb)
+    vecs = np.load(str(kb.full_path)) if manifest.get("projection") else np.asarray(rag._read_vectors(kb), dtype="float32")
+    meta = json.loads(kb.meta_path.read_text(encoding="utf-8"))
+    questions = [c["q"] for c in json.loads(Path("data/test_cases.json").read_text(encoding="utf-8"))] if name in (None, "default") else []
+    # Each chunk's heading/first words stand in for questions about it
+    questions += [" ".join((c.get("headings") or [])[-1:] + c["text"].split()[:12]) for c in meta]
+    return vecs, rag.embed_texts(questions)
+
+def _synthetic(n, dim, queries, rank=64):
+    """Unit vectors with a decaying spectrum (sentence embeddings are far from isotropic)."""
+    rng = np.random.default_rng(0)
+    basis = rng.standard_normal((rank, dim)).astype("float32")
+    weights = (1.0 / np.arange(1, rank + 1) ** 0.5).astype("float32")
+    vecs = (rng.standard_normal((n, rank)).astype("float32") * weights) @ basis
+    vecs += 0.05 * np.linalg.norm(vecs, axis=1, keepdims=True).mean() / np.sqrt(dim) * rng.standard_normal((n, dim)).astype("float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    q = vecs[rng.integers(0, n, queries)] + 0.02 * rng.standard_normal((queries, dim)).astype("float32")
+    return vecs, q / np.linalg.norm(q, axis=1, keepdims=True)
+
+def _time_us(fn, queries):
+    runs = []
+    for q in queries:
+        t = time.perf_counter()
+        fn(q)
+        runs.append((time.perf_counter() - t) * 1e6)
+    return statistics.median(runs)
+
+def main():
+    ap = argparse.ArgumentParser(description="Recall loss vs. memory and latency of PCA-projected chunk vectors.")
+    ap.add_argument("--kb", default=None, help="KB whose index vectors are used (default: the built-in KB)")
+    ap.add_argument("--synthetic", type=int, default=0, help="use N synthetic vectors instead of a KB")
+    ap.add_argument("--dim", type=int, default=384, help="width of the synthetic vectors")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--dims", default="256,128,64,32,16")
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--rescore", type=int, default=32, help="candidates rescored at full width")
+    args = ap.parse_args()
+
+    if args.synthetic:
+        vecs, queries = _synthetic(args.synthetic, args.dim, args.queries)
+    else:
+        vecs, queries = _kb_vectors(args.kb)
+        queries = queries[:args.queries]
+    n, d = vecs.shape
+    k = min(args.k, n)
+    exact = [set(_top(vecs @ q, k)) for q in queries]
+    full_us = _time_us(lambda q: _top(vecs @ q, k), queries)
+
+    print(f"chunks={n} dim={d} queries={len(queries)} k={k} rescore={args.rescore}")
+    print(f"{'dim':>5} {'whiten':>6} {'var kept':>8} {'MB':>8} {'mem':>6} {'recall':>7} {'+rescore':>8} {'us':>8} {'+rescore':>8} {'fit s':>6}")
+    print(f"{d:>5} {'-':>6} {1:>8.1%} {vecs.nbytes / 2**20:>8.2f} {1:>6.0%} {1:>7.3f} {'-':>8} {full_us:>8.1f} {'-':>8} {'-':>6}")
+    seen = set()
+    for target in sorted({int(x) for x in args.dims.split(",")}, reverse=True):
+        for whiten in (False, True):
+            t = time.perf_counter()
+            proj = fit_projection(vecs, target, whiten)
+            fit_s = time.perf_counter() - t
+            if proj is None or (proj.dim, whiten) in seen:
+                continue  # no reduction, or capped at the same width (a small KB has at most chunks - 1 axes)
+            seen.add((proj.dim, whiten))
+            low = proj.apply_rows(vecs)
+            pq = proj.apply(queries)
+            c = max(k, min(args.rescore, n))
+            recall = recall_rs = 0.0
+            for q, q_low, ex in zip(queries, pq, exact):
+                recall += len(set(_top(low @ q_low, k)) & ex) / k
+                recall_rs += len(set(_rescored(low, vecs, q_low, q, c, k)) & ex) / k
+            search_us = _time_us(lambda q: _top(low @ proj.apply(q), k), queries)
+            rescore_us = _time_us(lambda q: _rescored(low, vecs, proj.apply(q), q, c, k), queries)
+            print(
+                f"{proj.dim:>5} {'yes' if whiten else 'no':>6} {proj.explained:>8.1%} {low.nbytes / 2**20:>8.2f} {low.nbytes / vecs.nbytes:>6.0%}"
+                f" {recall / len(queries):>7.3f} {recall_rs / len(queries):>8.3f} {search_us:>8.1f} {rescore_us:>8.1f} {fit_s:>6.2f}"
+            )
+
+if __name__ == "__main__":
+    main()
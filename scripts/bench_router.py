@@ -0,0 +1,106 @@
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from app import main
+from app.config import ROUTER_MARGIN, ROUTER_MAX_SIM, ROUTER_MIN_SIM
+from app.rag import embed_query, embed_texts
+from app.router import SemanticRouter, faq_examples
+
+
+def _rules(question):
+    item = main.route_core_by_keywords(question)
+    if item is not None:
+        return item, 0.95
+    return main._match_core_fuzzy(question)
+
+def _faq_id(hit):
+    return None if hit is None else int(hit[0]["id"])
+
+def _time_us(fn, questions, repeat=5):
+    per_q = []
+    for q in questions:
+        runs = []
+        for _ in range(repeat):
+            embed_query.cache_clear()  # include the query embedding in the semantic timing
+            t = time.perf_counter()
+            fn(q)
+            runs.append((time.perf_counter() - t) * 1e6)
+        per_q.append(min(runs))
+    return statistics.median(per_q), float(np.percentile(per_q, 95))
+
+def _mode_accuracy(cases, router):
+    main.CORE_ROUTER = router
+    main.kb_state().answers = (object(), None)  # rebuild the exact-hit table with this router
+    ok = 0
+    for c in cases:
+        data = json.loads(main.chat(main.ChatIn(question=c["q"])).body)
+        ok += data.get("mode") == c.get("expect_mode", data.get("mode"))
+    return ok / len(cases)
+
+def _leave_one_out(examples):
+    """Route each alias with itself removed from the examples; report share routed to its FAQ."""
+    canon = {main._norm_q(it["question"]) for it in main.FAQ_ITEMS}
+    vec = dict(zip([t for t, _ in examples], embed_texts([t for t, _ in examples])))
+    encode = lambda texts: np.stack([vec[t] for t in texts])
+    held = [(i, t, f) for i, (t, f) in enumerate(examples) if t not in canon]
+    sem_ok = rule_ok = sem_abstain = 0
+    st = main.kb_state()
+    all_aliases = st.aliases
+    for i, text, faq in held:
+        rest = examples[:i] + examples[i + 1:]
+        r = SemanticRouter(rest, encode, ROUTER_MIN_SIM, ROUTER_MAX_SIM, ROUTER_MARGIN)
+        hit = r.route(vec[text])
+        sem_abstain += hit is None
+        sem_ok += hit is not None and hit[0] == faq
+        st.aliases = tuple(a for a in all_aliases if main._norm_q(a.get("alias", "")) != text)
+        rule_ok += _faq_id(_rules(text)) == faq
+    st.aliases = all_aliases
+    return len(held), sem_ok, sem_abstain, rule_ok
+
+def main_():
+    cases = json.loads(Path("data/test_cases.json").read_text(encoding="utf-8"))
+    questions = [c["q"] for c in cases]
+    router = main.core_router()
+
+    print(f"core router: {len(router.texts)} examples, {len(router.faq_ids)} FAQs, dim {router.vecs.shape[1]}")
+    print("\n== data/test_cases.json (end-to-end mode accuracy) ==")
+    acc_rules = _mode_accuracy(cases, "rules")
+    acc_sem = _mode_accuracy(cases, "semantic")
+    print(f"  rules     {acc_rules:.0%}")
+    print(f"  semantic  {acc_sem:.0%}")
+
+    print("\n== core routing decisions on test_cases.json ==")
+    main.CORE_ROUTER = "semantic"
+    diff = 0
+    for q in questions:
+        a = _faq_id(_rules(q))
+        b = _faq_id(main.match_core_faq(q))
+        if a != b:
+            diff += 1
+            print(f"  {q!r}: rules -> {a}, semantic -> {b}")
+    print(f"  {len(questions) - diff}/{len(questions)} identical")
+
+    print("\n== latency per question (median / p95, microseconds) ==")
+    sem_only = lambda q: router.route(embed_query(main._norm_q(q)))
+    for name, fn in (("rule chain (keywords + difflib)", _rules), ("semantic router only (embed + matmul)", sem_only), ("match_core_faq (overrides + semantic + fuzzy)", main.match_core_faq)):
+        p50, p95 = _time_us(fn, questions)
+        print(f"  {name:48} {p50:9.1f} {p95:9.1f}")
+    q_emb = embed_query(main._norm_q(questions[0]))
+    t = time.perf_counter()
+    for _ in range(1000):
+        router.route(q_emb)
+    print(f"  {'matrix product + thresholds (embedding given)':48} {(time.perf_counter() - t) * 1000:9.1f}")
+
+    print("\n== leave-one-out over aliases (routed to the alias's FAQ) ==")
+    n, sem_ok, sem_abstain, rule_ok = _leave_one_out(faq_examples(main.FAQ_ITEMS, main.ALIASES, main._norm_q))
+    print(f"  semantic  {sem_ok}/{n} correct, {sem_abstain} abstained")
+    print(f"  rules     {rule_ok}/{n} correct")
+
+if __name__ == "__main__":
+    main_()
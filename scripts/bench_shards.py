@@ -0,0 +1,73 @@
+import argparse
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.error import URLError
+
+import numpy as np
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from app.shards import write_shards, scatter_search
+
+HERE = Path(__file__).resolve().parent
+
+def _wait_ready(addrs, dim, timeout=20.0):
+    q = np.zeros(dim, dtype="float32")
+    t0 = time.time()
+    while time.time() - t0 < timeout:
+        try:
+            if all(scatter_search(q, 1, addrs=[a], timeout=5.0)[0] for a in addrs):
+                return
+        except URLError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("shard servers did not start")
+
+def main():
+    ap = argparse.ArgumentParser(description="Scatter-gather latency/throughput vs. number of shards (synthetic vectors).")
+    ap.add_argument("--chunks", type=int, default=200_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--max-shards", type=int, default=4)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=4)
+    ap.add_argument("--base-port", type=int, default=9300)
+    args = ap.parse_args()
+
+    rng = np.random.default_rng(0)
+    vecs = rng.standard_normal((args.chunks, args.dim), dtype="float32")
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    queries = vecs[rng.integers(0, args.chunks, args.queries)]
+
+    print(f"chunks={args.chunks} dim={args.dim} queries={args.queries} k={args.k}")
+    print(f"{'shards':>6} {'p50 ms':>8} {'p95 ms':>8} {'qps':>8} {'speedup':>8}")
+    base = None
+    for n in range(1, args.max_shards + 1):
+        with tempfile.TemporaryDirectory() as d:
+            write_shards(vecs, n, Path(d))
+            addrs = [f"127.0.0.1:{args.base_port + i}" for i in range(n)]
+            procs = [
+                subprocess.Popen([sys.executable, str(HERE / "shard_server.py"), "--shard", str(i), "--dir", d, "--port", str(args.base_port + i)])
+                for i in range(n)
+            ]
+            try:
+                _wait_ready(addrs, args.dim)
+                lat = []
+                t0 = time.perf_counter()
+                for q in queries:
+                    t = time.perf_counter()
+                    scatter_search(q, args.k, addrs=addrs, timeout=10.0)
+                    lat.append((time.perf_counter() - t) * 1000)
+                total = time.perf_counter() - t0
+            finally:
+                for p in procs:
+                    p.terminate()
+                for p in procs:
+                    p.wait()
+        p50, p95 = np.percentile(lat, [50, 95])
+        base = base or p50
+        print(f"{n:>6} {p50:>8.2f} {p95:>8.2f} {args.queries / total:>8.1f} {base / p50:>7.2f}x")
+
+if __name__ == "__main__":
+    main()
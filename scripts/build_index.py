@@ -1,9 +1,39 @@
+import argparse
 import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
+from app.artifacts import pack_bundle
+from app.config import CACHE_DIR
+from app.kbs import get_kb
 from app.rag import build_index
 
+def _progress(s):
+    print(
+        f"\r  files {s['docs']}/{s['total_docs']}  chunks {s['chunks']}  "
+        f"({s['files_per_s']:.1f} files/s, {s['chunks_per_s']:.1f} chunks/s)",
+        end="", flush=True,
+    )
+
 if __name__ == "__main__":
-    stats = build_index()
+    ap = argparse.ArgumentParser(description="Build the KB index in .cache/ (and optionally a deployable bundle).")
+    ap.add_argument(
+        "--bundle", nargs="?", const="", default=None, metavar="PATH",
+        help="also write a verified artifact bundle (default: .cache/bundles/kb-<version>.tar.gz); "
+             "servers install it with INDEX_BUNDLE=PATH",
+    )
+    ap.add_argument("--kb", default=None, metavar="NAME", help="build KBS_DIR/NAME instead of the default KB")
+    args = ap.parse_args()
+
+    try:
+        kb = get_kb(args.kb)
+    except KeyError:
+        ap.error(f"no knowledge base {args.kb!r} (expected KBS_DIR/{args.kb}/knowledge_base/)")
+    if args.bundle is not None and args.kb:
+        ap.error("--bundle is only supported for the default KB")
+    stats = build_index(progress=_progress, kb=kb)
+    print()
     print("Index built:", stats)
+    if args.bundle is not None:
+        out = Path(args.bundle) if args.bundle else CACHE_DIR / "bundles" / f"kb-{stats['version']}.tar.gz"
+        print("Bundle written:", pack_bundle(out))
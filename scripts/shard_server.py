@@ -0,0 +1,38 @@
+import argparse
+import subprocess
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from app.shards import serve_shard, shard_path, SHARDS_DIR
+
+def main():
+    ap = argparse.ArgumentParser(description="Serve index shards written by build_index() (INDEX_SHARDS > 1).")
+    ap.add_argument("--shard", type=int, help="serve a single shard number")
+    ap.add_argument("--shards", type=int, help="spawn one local server process per shard 0..N-1")
+    ap.add_argument("--dir", default=str(SHARDS_DIR))
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9100, help="port (base port with --shards)")
+    args = ap.parse_args()
+
+    if args.shard is not None:
+        serve_shard(shard_path(args.shard, Path(args.dir)), args.host, args.port)
+        return
+
+    n = args.shards or len(list(Path(args.dir).glob("shard_*.npz")))
+    procs = [
+        subprocess.Popen([sys.executable, __file__, "--shard", str(i), "--dir", args.dir, "--host", args.host, "--port", str(args.port + i)])
+        for i in range(n)
+    ]
+    print("SHARD_ADDRS=" + ",".join(f"{args.host}:{args.port + i}" for i in range(n)), flush=True)
+    try:
+        for p in procs:
+            p.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs:
+            p.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,96 @@
 import json
+import shutil
+import tempfile
+import threading
+import time
 from pathlib import Path
 
-from app.main import chat, ChatIn
+from app import llm, rag
+from app.config import KB_DIR
+from app.kbs import KB
+from app.main import ALIASES, FAQ_ITEMS, chat, ChatIn, _core_by_id
+
+def check_core_answers():
+    """The 12 core questions and their aliases must return the curated reference answers."""
+    checks = [(it["question"], it) for it in FAQ_ITEMS] + [(a["alias"], _core_by_id(a["core_id"])) for a in ALIASES if a.get("alias")]
+    ok = 0
+    for q, item in checks:
+        data = json.loads(chat(ChatIn(question=q)).body.decode("utf-8"))
+        good = item is not None and data.get("answer") == (item.get("reference_answer") or "").strip()
+        if not good:
+            print(f"[MISMATCH] core answer for {q!r} (FAQ {item and item.get('id')}): {data.get('answer', '')[:80]!r}")
+        ok += good
+    print(f"Core answers: {ok}/{len(checks)}")
+    return ok == len(checks)
+
+def check_incremental():
+    """Edits applied with rag.update_index() (as the KB watcher does) must give the same
+    chunks, facts and index version as a full rebuild of the edited KB."""
+    def chunks(kb):
+        return sorted((c["text"], tuple(sorted(c["sources"]))) for c in json.loads(kb.meta_path.read_text(encoding="utf-8")))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        shutil.copytree(KB_DIR, root / "knowledge_base")
+        incr = KB("smoke-incr", root / "knowledge_base", root / "data", root / "cache-incr")
+        full = KB("smoke-full", root / "knowledge_base", root / "data", root / "cache-full")
+        rag.build_index(kb=incr)
+        ok = rag.update_index(["pricing.md", "support.md"], incr) is None  # untouched files: nothing to do
+        d = incr.kb_dir
+        (d / "pricing.md").write_text((d / "pricing.md").read_text(encoding="utf-8") + "\n## Extras\n- Penguin hosting: from €999\n", encoding="utf-8")
+        (d / "new.md").write_text("# Llamas\n\n## Care\nLlamas need hay and friendship every single day.\n", encoding="utf-8")
+        (d / "policies.md").unlink()
+        (d / "support_copy.md").write_text((d / "support.md").read_text(encoding="utf-8"), encoding="utf-8")  # collapsed duplicate
+        steps = [["pricing.md", "new.md", "policies.md", "support_copy.md"], ["support.md"]]
+        for i, names in enumerate(steps):
+            if i:  # edit the file whose chunks the duplicate was collapsed into
+                (d / "support.md").write_text((d / "support.md").read_text(encoding="utf-8") + "\nExtra line about pagers.\n", encoding="utf-8")
+            st = rag.update_index(names, incr)
+            ref = rag.build_index(kb=full)
+            same = (
+                st is not None and chunks(incr) == chunks(full) and st["version"] == ref["version"]
+                and json.loads(incr.facts_path.read_text(encoding="utf-8")) == json.loads(full.facts_path.read_text(encoding="utf-8"))
+            )
+            if not same:
+                print(f"[MISMATCH] incremental update of {names} differs from a full rebuild")
+            ok = ok and same
+    print(f"Incremental reindex matches full rebuild: {'yes' if ok else 'NO'}")
+    return ok
+
+def check_breaker():
+    """A call refused because the LLM gate is full must not use up the breaker's half-open
+    trial, and calls started before the trip (stragglers) must not close the breaker."""
+    release = threading.Event()
+    saved = llm._call_providers, llm._openai_available
+    llm._call_providers = lambda question, context: release.wait(5) and "ok"
+    llm._openai_available = lambda: True
+    try:
+        gate = llm._LLMGate()
+        gate.breaker = llm.CircuitBreaker(window=5, failure_rate=0.5, slow_s=10.0, cooldown_s=0.2)
+        stragglers = []
+        while True:
+            fut, status = gate.submit("q", "")
+            if status != "submitted":
+                break
+            stragglers.append(fut)
+        for _ in range(5):
+            gate.breaker.record(False, 0.0)  # trip while the stragglers still hold the gate
+        time.sleep(0.3)  # cooldown over: half-open
+        steps = [gate.submit("q", "")[1] == "rejected"]
+        release.set()
+        for fut in stragglers:
+            fut.result(timeout=5)
+        steps.append(gate.breaker.state == "half_open")  # straggler outcomes did not close it
+        fut, status = gate.submit("q", "")
+        steps.append(status == "submitted" and fut.result(timeout=5) == "ok")
+        time.sleep(0.05)
+        steps.append(gate.breaker.state == "closed")  # the trial's success closed it
+    finally:
+        release.set()
+        llm._call_providers, llm._openai_available = saved
+    ok = all(steps)
+    print(f"LLM breaker half-open trial survives a full gate: {'yes' if ok else 'NO ' + str(steps)}")
+    return ok
 
 def main():
     cases = json.loads(Path("data/test_cases.json").read_text(encoding="utf-8"))
@@ -9,17 +98,23 @@ def main():
     for i, c in enumerate(cases, 1):
         q = c["q"]
         exp = c.get("expect_mode")
+        core = _core_by_id(c["expect_core_id"]) if "expect_core_id" in c else None
         resp = chat(ChatIn(question=q)).body
         data = json.loads(resp.decode("utf-8"))
         mode = data.get("mode", "grounded" if not data.get("is_fallback") else "fallback")
         good = (exp is None) or (mode == exp)
+        if core is not None:
+            good = good and data.get("answer") == (core.get("reference_answer") or "").strip()
         status = "OK" if good else "MISMATCH"
         print(f"[{status}] {i:02d}. {q}")
         print(f"  mode={mode}  confidence={float(data.get('confidence',0)):.2f}  sources={data.get('sources')}")
         if not good:
-            print(f"  expected={exp}")
+            print(f"  expected={exp}" + (f" (core FAQ {c['expect_core_id']})" if core is not None else ""))
         ok += 1 if good else 0
     print(f"\nPassed: {ok}/{len(cases)}")
+    check_core_answers()
+    check_incremental()
+    check_breaker()
 
 if __name__ == "__main__":
     main()
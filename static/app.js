@@ -101,6 +101,137 @@ const samples = [
   "Can you draft a legal contract for me?"
 ];
 
+/* ---------- Answer cache (guided prompts + samples) ----------
+   Answers are keyed by (server answer generation, normalized question), kept in memory and
+   persisted to IndexedDB when available. On load, one POST /chat/batch prefetches every
+   known prompt; if the server's generation is unchanged it answers "unchanged" without work. */
+const CACHE_DB = "faq-chatbot";
+const CACHE_STORE = "answers";
+const REVALIDATE_MS = 60 * 1000;
+
+const answerCache = {
+  generation: null,
+  mem: new Map(),
+  db: null,
+  checkedAt: 0,
+  inflight: null
+};
+
+function cacheKey(q) {
+  return (q || "").trim().toLowerCase().replace(/\s+/g, " ");
+}
+
+function knownPrompts() {
+  const all = new Set(samples);
+  Object.values(guided).forEach((qs) => qs.forEach((q) => all.add(q)));
+  return Array.from(all);
+}
+
+function idbRequest(req) {
+  return new Promise((resolve, reject) => {
+    req.onsuccess = () => resolve(req.result);
+    req.onerror = () => reject(req.error);
+  });
+}
+
+async function openCacheDb() {
+  if (!("indexedDB" in window)) return null;
+  try {
+    const req = indexedDB.open(CACHE_DB, 1);
+    req.onupgradeneeded = () => req.result.createObjectStore(CACHE_STORE, { keyPath: "key" });
+    return await idbRequest(req);
+  } catch (e) {
+    return null; // private mode etc.: memory only
+  }
+}
+
+async function loadCache() {
+  answerCache.db = await openCacheDb();
+  answerCache.generation = localStorage.getItem("kbGeneration");
+  if (!answerCache.db || !answerCache.generation) return;
+  try {
+    const rows = await idbRequest(answerCache.db.transaction(CACHE_STORE).objectStore(CACHE_STORE).getAll());
+    rows.forEach((r) => {
+      if (r.gen === answerCache.generation) answerCache.mem.set(r.q, r.data);
+    });
+  } catch (e) {
+    /* ignore: start with an empty cache */
+  }
+}
+
+function resetCache(generation) {
+  answerCache.generation = generation;
+  answerCache.mem.clear();
+  try {
+    localStorage.setItem("kbGeneration", generation);
+  } catch (e) {
+    /* ignore */
+  }
+  if (answerCache.db) {
+    try {
+      answerCache.db.transaction(CACHE_STORE, "readwrite").objectStore(CACHE_STORE).clear();
+    } catch (e) {
+      /* ignore */
+    }
+  }
+}
+
+function cachePut(q, data) {
+  const key = cacheKey(q);
+  answerCache.mem.set(key, data);
+  if (answerCache.db) {
+    try {
+      answerCache.db
+        .transaction(CACHE_STORE, "readwrite")
+        .objectStore(CACHE_STORE)
+        .put({ key: answerCache.generation + "\u0001" + key, gen: answerCache.generation, q: key, data });
+    } catch (e) {
+      /* ignore */
+    }
+  }
+}
+
+// One batched request for all known prompts; cheap when the cached generation is current.
+function prefetchAnswers() {
+  if (answerCache.inflight) return answerCache.inflight;
+  const questions = knownPrompts();
+  answerCache.inflight = (async () => {
+    try {
+      const res = await fetch("/chat/batch", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ questions, generation: answerCache.generation })
+      });
+      if (!res.ok) return;
+      const data = await res.json();
+      answerCache.checkedAt = Date.now();
+      if (data.unchanged) return;
+      resetCache(data.generation);
+      (data.answers || []).forEach((a, i) => {
+        if (a) cachePut(questions[i], a);
+      });
+    } catch (e) {
+      /* offline / server down: keep what we have */
+    } finally {
+      answerCache.inflight = null;
+    }
+  })();
+  return answerCache.inflight;
+}
+
+function revalidateSoon() {
+  if (Date.now() - answerCache.checkedAt > REVALIDATE_MS) prefetchAnswers();
+}
+
+function showAnswer(data) {
+  const meta = {
+    mode: data.mode || (data.is_fallback ? "fallback" : "grounded"),
+    confidence: Number(data.confidence || 0),
+    sources: data.sources || []
+  };
+  renderMessage({ role: "bot", text: data.answer || "", meta });
+}
+
 function setStatus(text) {
   $("status").textContent = text;
 }
@@ -150,6 +281,14 @@ async function ask(question) {
 
   renderMessage({ role: "user", text: q });
   $("q").value = "";
+
+  const cached = answerCache.mem.get(cacheKey(q));
+  if (cached) {
+    showAnswer(cached);
+    setStatus("Ready");
+    revalidateSoon();
+    return;
+  }
   setStatus("Thinking…");
 
   try {
@@ -160,13 +299,15 @@ async function ask(question) {
     });
 
     const data = await res.json();
-    const meta = {
-      mode: data.mode || (data.is_fallback ? "fallback" : "grounded"),
-      confidence: Number(data.confidence || 0),
-      sources: data.sources || []
-    };
-    renderMessage({ role: "bot", text: data.answer || "", meta });
+    showAnswer(data);
     setStatus("Ready");
+
+    const gen = res.headers.get("X-KB-Generation");
+    if (gen && gen !== answerCache.generation) {
+      prefetchAnswers(); // KB or FAQ changed: refill the cache for the new generation
+    } else if (gen && data.mode !== "error" && knownPrompts().includes(q)) {
+      cachePut(q, data); // known prompt that needed retrieval: cache it too
+    }
   } catch (e) {
     renderMessage({ role: "bot", text: "Server error. Please try again.", meta: { mode: "error", confidence: 0, sources: [] } });
     setStatus("Error");
@@ -184,12 +325,110 @@ function mountSamples() {
   });
 }
 
+/* ---------- Typeahead ----------
+   Debounced GET /suggest; a newer keystroke aborts the request still in flight. */
+const SUGGEST_DEBOUNCE_MS = 120;
+
+function mountSuggest() {
+  const input = $("q");
+  const list = $("suggest");
+  if (!input || !list) return;
+  let timer = null;
+  let controller = null;
+  let items = [];
+  let active = -1;
+
+  function close() {
+    list.hidden = true;
+    list.innerHTML = "";
+    input.setAttribute("aria-expanded", "false");
+    items = [];
+    active = -1;
+  }
+
+  function highlight(i) {
+    active = i;
+    Array.from(list.children).forEach((li, j) => li.classList.toggle("active", j === i));
+  }
+
+  function pick(q) {
+    close();
+    ask(q);
+  }
+
+  function render(suggestions) {
+    list.innerHTML = "";
+    items = suggestions.map((s) => s.question);
+    active = -1;
+    items.forEach((q, i) => {
+      const li = el("li");
+      li.setAttribute("role", "option");
+      li.textContent = q;
+      // mousedown fires before the input's blur
+      li.addEventListener("mousedown", (e) => {
+        e.preventDefault();
+        pick(q);
+      });
+      li.addEventListener("mouseenter", () => highlight(i));
+      list.appendChild(li);
+    });
+    list.hidden = items.length === 0;
+    input.setAttribute("aria-expanded", items.length ? "true" : "false");
+  }
+
+  async function fetchSuggestions(text) {
+    if (controller) controller.abort();
+    controller = new AbortController();
+    try {
+      const res = await fetch("/suggest?q=" + encodeURIComponent(text), { signal: controller.signal });
+      const data = await res.json();
+      if (input.value.trim() === text) render(data.suggestions || []);
+    } catch (e) {
+      /* aborted by a newer keystroke, or offline */
+    }
+  }
+
+  input.addEventListener("input", () => {
+    clearTimeout(timer);
+    const text = input.value.trim();
+    if (text.length < 2) {
+      if (controller) controller.abort();
+      close();
+      return;
+    }
+    timer = setTimeout(() => fetchSuggestions(text), SUGGEST_DEBOUNCE_MS);
+  });
+
+  input.addEventListener("keydown", (e) => {
+    if (list.hidden || !items.length) return;
+    if (e.key === "ArrowDown" || e.key === "ArrowUp") {
+      e.preventDefault();
+      const step = e.key === "ArrowDown" ? 1 : -1;
+      highlight((active + step + items.length) % items.length);
+    } else if (e.key === "Enter" && active >= 0) {
+      e.preventDefault();
+      pick(items[active]);
+    } else if (e.key === "Escape") {
+      close();
+    }
+  });
+
+  input.addEventListener("blur", () => setTimeout(close, 100));
+  $("form").addEventListener("submit", () => {
+    clearTimeout(timer);
+    if (controller) controller.abort();
+    close();
+  });
+}
+
 async function reindex() {
   setStatus("Reindexing…");
   try {
     const res = await fetch("/reindex", { method: "POST" });
     const data = await res.json();
     if (data && data.ok) {
+      answerCache.checkedAt = 0;
+      prefetchAnswers();
       setStatus("Reindexed");
       setTimeout(() => setStatus("Ready"), 1000);
     } else {
@@ -203,6 +442,8 @@ async function reindex() {
 window.addEventListener("DOMContentLoaded", () => {
   mountSamples();
   mountGuide();
+  mountSuggest();
+  loadCache().then(prefetchAnswers);
   renderMessage({
     role: "bot",
     text: "Hi! Ask me anything about ARV Digital Services (services, pricing, process, support/SLA, or policies).\n\nIf something is unclear, I’ll ask a quick clarifying question.",